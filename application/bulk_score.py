@@ -0,0 +1,104 @@
+import csv
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.aws_clients import get_client
+from utils.boto3_helper import download_from_s3
+from utils.decoding import decompress
+from utils.evalution_criteria import ReturnIndex, compute_metrics, normalize_dtypes, read_chars, read_weights
+from utils.result_commit import commit_rescored, leaderboard_partition
+
+COMPLETE_DATA_S3_URI = os.environ.get("COMPLETE_DATA_S3_URI","s3://jkpfactors-training-data/complete/2024/")
+COMPLETE_DATA_PATH = os.environ.get("COMPLETE_DATA_PATH","data/")
+
+# unprocessed/trainings/{email}/{submission_timestamp}/train/YYYY/MM/training_results.{csv,parquet,arrow}
+WEIGHTS_KEY_PATTERN = re.compile(r"unprocessed/trainings/(?P<email>[^/]+)/(?P<submission_timestamp>[^/]+)/train/")
+
+METRIC_NAMES = ["sortino", "max_drawdown", "turnover", "hit_rate", "gross_leverage", "net_leverage"]
+
+logging.getLogger().setLevel(logging.INFO)
+
+# Built once in the parent; forked workers share its pages copy-on-write
+_return_index = None
+
+def load_return_index(chars_s3_uri):
+    chars_file = os.path.join(COMPLETE_DATA_PATH, "ctff_chars.parquet")
+    download_from_s3(chars_s3_uri.rstrip("/") + "/ctff_chars.parquet", chars_file)
+    chars = normalize_dtypes(read_chars(chars_file, columns=['id', 'eom', 'ret_exc_lead1m']))
+    return ReturnIndex.from_frame(chars)
+
+def score_weights_file(weights_s3_uri):
+    match = WEIGHTS_KEY_PATTERN.search(weights_s3_uri)
+    result = {
+        "weights": weights_s3_uri,
+        "email": match.group("email") if match else "",
+        "submission_timestamp": match.group("submission_timestamp") if match else "",
+        "sharpe_ratio": "",
+        "metrics": {},
+        "error": "",
+    }
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            local_path = os.path.join(tmp_dir, weights_s3_uri.split("/")[-1])
+            download_from_s3(weights_s3_uri, local_path, cache=False)
+            # Published weights may be stored gzip/zstd-encoded
+            pf = read_weights(decompress(local_path))
+        result["metrics"] = compute_metrics(pf, _return_index)
+        result["sharpe_ratio"] = str(result["metrics"]["sharpe"])
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+def score_many(weights_s3_uris, chars_s3_uri=COMPLETE_DATA_S3_URI, workers=None):
+    global _return_index
+    _return_index = load_return_index(chars_s3_uri)
+    workers = workers or os.cpu_count()
+    if workers <= 1:
+        return [score_weights_file(uri) for uri in weights_s3_uris]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as executor:
+        return list(executor.map(score_weights_file, weights_s3_uris))
+
+def write_results(results, results_s3_uri):
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", newline="", delete=False) as file:
+        writer = csv.DictWriter(file, fieldnames=["weights", "email", "submission_timestamp", "sharpe_ratio", *METRIC_NAMES, "error"], extrasaction="ignore")
+        writer.writeheader()
+        for result in results:
+            writer.writerow({**{k: v for k, v in result.items() if k != "metrics"}, **result["metrics"]})
+    bucket, key = results_s3_uri.replace("s3://", "").split("/", 1)
+    get_client('s3').upload_file(file.name, bucket, key)
+    os.remove(file.name)
+
+def main(weights_s3_uris, chars_s3_uri, workers, results_s3_uri, update_dynamodb):
+    results = score_many(weights_s3_uris, chars_s3_uri, workers)
+    failed = [r for r in results if r["error"]]
+    logging.info(f"Scored {len(results) - len(failed)} of {len(results)} weight files")
+    for r in failed:
+        logging.error(f"{r['weights']}: {r['error']}")
+
+    if results_s3_uri:
+        write_results(results, results_s3_uri)
+    if update_dynamodb:
+        commit_rescored([r for r in results if not r["error"] and r["email"]], leaderboard_partition(chars_s3_uri))
+    return results
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Re-score many training_results files against one dataset in a single process.')
+    parser.add_argument('--weights_s3_uris', type=str, nargs='*', default=[], help='S3 URIs of training_results files (CSV, Parquet or Arrow IPC).')
+    parser.add_argument('--weights_list_file', type=str, help='Local file with one weights S3 URI per line.')
+    parser.add_argument('--chars_s3_uri', type=str, default=COMPLETE_DATA_S3_URI, help='S3 prefix of the dataset holding ctff_chars.parquet.')
+    parser.add_argument('--workers', type=int, default=None, help='Number of scoring processes (default: CPU count).')
+    parser.add_argument('--results_s3_uri', type=str, help='S3 URI where the results CSV is written.')
+    parser.add_argument('--update_dynamodb', action='store_true', help='Store the new Sharpe ratios in the benchmarks table.')
+
+    args = parser.parse_args()
+    weights_s3_uris = list(args.weights_s3_uris)
+    if args.weights_list_file:
+        with open(args.weights_list_file) as file:
+            weights_s3_uris += [line.strip() for line in file if line.strip()]
+    main(weights_s3_uris, args.chars_s3_uri, args.workers, args.results_s3_uri, args.update_dynamodb)
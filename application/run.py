@@ -1,10 +1,18 @@
 import boto3
 import os
-from utils.evalution_criteria import calculate_sharpe_ratio,check_required_columns,compare_columns
-from utils.runtime_checks import run_script
-from utils.static_checks import perform_static_checks
-from utils.replace_func import update_script_with_template_functions,replace_main_block
-from utils.boto3_helper import store_sharpe_ratio_in_dynamodb,send_failure_email,upload_script_to_s3,download_from_s3,upload_weights_to_s3,update_submissions_dynamodb
+from utils.evalution_criteria import EvaluationContext,calculate_metrics,check_required_columns,compare_columns
+from utils.runtime_checks import SCRIPT_LOG_DIR,prepare_runner,run_script
+from utils.static_checks import check_syntax,perform_static_checks
+from utils.replace_func import render_script
+from utils.boto3_helper import send_failure_email,download_from_s3,accepted_prefix,weights_prefix
+from utils.result_commit import commit_result,leaderboard_partition
+from utils.artifacts import MANIFEST_NAME,Artifact,ArtifactPublisher
+from utils.instrumentation import span,trace_job,write_timings
+from utils.staging import plan_staging,stage_datasets,staged_objects
+from utils import verification_cache
+from utils.output_validation import find_results_file
+from utils.decoding import decode_file
+import glob
 import logging
 import re
 
@@ -18,122 +26,174 @@ SHOULD_PERFORM_INTEGRITY_CHECK = os.environ.get("SHOULD_PERFORM_INTEGRITY_CHECK"
 AWS_DEFAULT_REGION = os.environ.get("AWS_DEFAULT_REGION","us-east-1")
 RETRAIN = os.environ.get("RETRAIN","False")=="True"
 
-logging.getLogger().setLevel(logging.DEBUG)
-
-def decode_file(file_name):
-    # Read the string representation of the code from the input file
-    with open(file_name, 'r') as file:
-        code_str = file.read()
-
-    # Remove the leading and trailing quotes if they exist
-    if code_str.startswith('"') and code_str.endswith('"'):
-        code_str = code_str[1:-1]
+# Datasets each phase reads; the integrity check compares the user output against the complete chars
+DATASETS = {
+    'integrity_check': (INTEGRITY_CHECK_DATA_S3_URI, INTEGRITY_CHECK_DATA_LOCAL_PATH),
+    'complete': (COMPLETE_DATA_S3_URI, COMPLETE_DATA_PATH),
+}
+PHASE_DATASETS = {
+    'integrity_check': ['integrity_check', 'complete'],
+    'complete_training': ['complete'],
+}
+# Functions replaced in the user script and the __main__ block swapped in, per phase
+TEMPLATES = {
+    'integrity_check': ({
+        'load_data': 'templates/integrity_check/load_func.py',
+        'export_data': 'templates/integrity_check/export_func.py',
+    }, 'templates/integrity_check/main_block.py'),
+    'complete_training': ({
+        'load_data': 'templates/complete_data/load_func.py',
+        'export_data': 'templates/complete_data/export_func.py',
+    }, 'templates/complete_data/main_block.py'),
+}
 
-    # Convert common escape sequences
-    normal_code = code_str.replace(r'\r\n', '\n').replace(r'\n', '\n').replace(r'\/', '/').replace(r'\t', '\t').encode().decode('unicode_escape')
+logging.getLogger().setLevel(logging.DEBUG)
 
-    # Write the converted code to the output file
-    with open(file_name, 'w') as file:
-        file.write(normal_code)
+def integrity_check_cache_key(script_file, output_file):
+    template_functions_mapping, main_block_template_path = TEMPLATES['integrity_check']
+    dataset_objects = [obj for name in PHASE_DATASETS['integrity_check'] for obj in staged_objects(DATASETS[name][0])]
+    return verification_cache.verification_key(script_file, [*template_functions_mapping.values(), main_block_template_path], dataset_objects, output_file)
 
-    logging.info(f"The file has been successfully decoded to {file_name}")
-            
-def perform_integrity_check(script_file, output_file):
+def perform_integrity_check(script_file, script_tree, output_file, context):
     
+    # A script that already passed against the same templates, datasets and output is not run again (e.g. retrains)
+    cache_key = integrity_check_cache_key(script_file, output_file)
+    cached = verification_cache.lookup(cache_key)
+    if cached:
+        logging.info(f"Integrity check already passed at {cached['verified_at']}, skipping")
+        # The accepted script is uploaded in its integrity-check form, as after a full run
+        render_script(script_tree, *TEMPLATES['integrity_check'], script_file)
+        return True, "All checks passed (cached verification)"
+
     # Step 1: Static Checks
-    is_valid, message = perform_static_checks(script_file)
+    with span("static_checks"):
+        is_valid, message = perform_static_checks(script_file, script_tree)
     if not is_valid:
         return False, message
     
     # Step 2: Check the output csv if it contains all required columns.
-    is_valid, message = check_required_columns(output_file)
-    if not is_valid:
-        return False, message
-
-    is_valid, message = compare_columns(output_file)
+    with span("validate_user_output"):
+        is_valid, message = check_required_columns(output_file, context=context)
+        if is_valid:
+            is_valid, message = compare_columns(output_file, context=context)
     if not is_valid:
         return False, message
     # Step 3: Runtime Checks
-    template_functions_mapping = {
-        'load_data': 'templates/integrity_check/load_func.py',
-        'export_data': 'templates/integrity_check/export_func.py',
-    }
-    update_script_with_template_functions(script_file,template_functions_mapping)
-    main_block_template_path = "templates/integrity_check/main_block.py"
-    replace_main_block(script_file, main_block_template_path)
+    with span("ast_rewrite", phase="integrity_check"):
+        render_script(script_tree, *TEMPLATES['integrity_check'], script_file)
 
     # Step 4: replace data loading and export function in the script file
-    is_valid, message = run_script(script_file)
+    with span("script_run", phase="integrity_check"):
+        is_valid, message = run_script(script_file, phase='integrity_check')
     if not is_valid:
         return False, message
     
     # Step 4: Check the output csv generated by script if it contains all required columns.
-    is_valid, message = check_required_columns("integrity-check/training_results.csv")
+    # Only validated, never scored, so it is streamed instead of loaded into the context
+    with span("validate_results", phase="integrity_check"):
+        is_valid, message = check_required_columns(find_results_file("integrity-check"))
     if not is_valid:
         return False, message
 
+    verification_cache.record(cache_key, script_file=script_file, output_file=output_file)
     return True, "All checks passed"
 
 def main(user_ml_script_s3_uri, user_ml_output_csv_s3_uri,submission_timestamp,email,user_name,model_name):
     # Define local paths
     script_file = user_ml_script_s3_uri.split("/")[-1]
     output_file = user_ml_output_csv_s3_uri.split("/")[-1]
+
+    # Warm the script runner (if pre-forking is enabled) while the inputs are downloaded
+    prepare_runner()
     
     # Download the files from S3
-    download_from_s3(user_ml_script_s3_uri, script_file)
-    decode_file(script_file)
-    download_from_s3(user_ml_output_csv_s3_uri, output_file)
-    decode_file(output_file)
+    with span("download_inputs"):
+        download_from_s3(user_ml_script_s3_uri, script_file, cache=False)
+        download_from_s3(user_ml_output_csv_s3_uri, output_file, cache=False)
+    with span("decode_inputs"):
+        # Compressed uploads come back under their uncompressed name
+        script_file = decode_file(script_file)
+        output_file = decode_file(output_file)
+
+    # Parsed once; static checks and both template variants share this tree
+    with span("parse_script"):
+        syntax_ok, script_tree = check_syntax(script_file)
+    syntax_message = None if syntax_ok else f"Syntax Error: {script_tree}"
+    script_tree = script_tree if syntax_ok else None
     
     
     is_valid = True
+    publisher = ArtifactPublisher(USER_SCRIPTS_BUCKET_NAME)
+    # Shared by every check and metric so chars and each output file are parsed once
+    context = EvaluationContext(os.path.join(COMPLETE_DATA_PATH, "ctff_chars.parquet"))
+
+    # Fetch the union of the datasets needed by the enabled phases, each prefix once
+    enabled_phases = [phase for phase, enabled in (('integrity_check', SHOULD_PERFORM_INTEGRITY_CHECK), ('complete_training', SHOULD_PERFORM_COMPLETE_TRAINING)) if enabled]
+    with span("stage_datasets"):
+        stage_datasets(plan_staging(enabled_phases, PHASE_DATASETS, DATASETS))
 
     if SHOULD_PERFORM_INTEGRITY_CHECK:
-        download_from_s3(INTEGRITY_CHECK_DATA_S3_URI,INTEGRITY_CHECK_DATA_LOCAL_PATH)
-        download_from_s3(COMPLETE_DATA_S3_URI,COMPLETE_DATA_PATH)
         # Run integrity checks
-        is_valid, message = perform_integrity_check(script_file, output_file)
+        with span("integrity_check"):
+            is_valid, message = perform_integrity_check(script_file, script_tree, output_file, context)
         print(message)
+        context.release(output_file)
         
-        if is_valid:
-            upload_script_to_s3(script_file,output_file,USER_SCRIPTS_BUCKET_NAME,email,submission_timestamp)
-        else:
-             send_failure_email(email=email,message=message)
+        with span("report_integrity_check"):
+            if is_valid:
+                prefix = accepted_prefix(email, submission_timestamp)
+                publisher.publish([
+                    Artifact('script', script_file, f"{prefix}/{script_file}"),
+                    Artifact('output', output_file, f"{prefix}/{output_file}"),
+                ])
+                # Integrity-only jobs stop here, so the accepted artifacts get their own manifest
+                publisher.write_manifest(f"{prefix}/{MANIFEST_NAME}", email=email, submission_timestamp=submission_timestamp, integrity_check=message)
+            else:
+                 send_failure_email(email=email,message=message)
 
 
     if is_valid and SHOULD_PERFORM_COMPLETE_TRAINING:
         
-        # Step 1: Replace data loading and export function in the script file
-        download_from_s3(COMPLETE_DATA_S3_URI,COMPLETE_DATA_PATH)
+        # Step 1: Make sure the complete dataset is staged (no-op when already fetched above)
+        stage_datasets(plan_staging(['complete_training'], PHASE_DATASETS, DATASETS))
         
-        # Step 2: Replace data loading and export function in the script file
-        template_functions_mapping = {
-            'load_data': 'templates/complete_data/load_func.py',
-            'export_data': 'templates/complete_data/export_func.py',
-        }
-        update_script_with_template_functions(script_file,template_functions_mapping)
-        # Replace the main block
-        main_block_template_path = "templates/complete_data/main_block.py"
-        replace_main_block(script_file, main_block_template_path)
+        # Step 2: Replace data loading and export function and the main block, starting from the original tree
+        if script_tree is None:
+            return False, syntax_message
+        with span("ast_rewrite", phase="complete_training"):
+            render_script(script_tree, *TEMPLATES['complete_training'], script_file)
 
         # Step 3: Run the downloaded script
-        is_valid, message = run_script(script_file)
+        with span("script_run", phase="complete_training"):
+            is_valid, message = run_script(script_file, phase='complete_training')
         if not is_valid:
             return False, message
         
         # Step 4: Check output columns
-        is_valid, message = check_required_columns("data/training_results.csv")
+        results_file = find_results_file("data")
+        with span("validate_results", phase="complete_training"):
+            is_valid, message = check_required_columns(results_file, context=context)
         if not is_valid:
             return False, message
         
-        # Step 5: Evaluation Criteria
-        is_valid, message = calculate_sharpe_ratio()
+        # Step 5: Evaluation Criteria (Sharpe plus the other portfolio statistics, in one pass)
+        with span("scoring"):
+            is_valid, metrics = calculate_metrics(results_file, context=context)
         if not is_valid:
-            return False, message
+            return False, metrics
+        message = str(metrics['sharpe'])
             
-        upload_weights_to_s3(USER_SCRIPTS_BUCKET_NAME,email,submission_timestamp)
-        update_submissions_dynamodb(email, submission_timestamp, script_file, output_file, RETRAIN ,message)
-        store_sharpe_ratio_in_dynamodb(sharpe_ratio=message,submission_timestamp=submission_timestamp,email=email,user_name=user_name,model_name=model_name,retrain=RETRAIN)
+        # Phase timings so far; the publish step itself and the job total are only in the logs and X-Ray
+        timings_file = write_timings()
+        with span("publish_results"):
+            prefix = weights_prefix(email, submission_timestamp)
+            publisher.publish([
+                Artifact('weights', results_file, f"{prefix}/{os.path.basename(results_file)}"),
+                Artifact('timings', timings_file, f"{prefix}/{os.path.basename(timings_file)}"),
+                *[Artifact('log', path, f"{prefix}/logs/{os.path.basename(path)}") for path in sorted(glob.glob(os.path.join(SCRIPT_LOG_DIR, "*.log")))],
+            ])
+            publisher.write_manifest(f"{prefix}/{MANIFEST_NAME}", email=email, submission_timestamp=submission_timestamp, sharpe_ratio=message)
+            commit_result(email, submission_timestamp, f"{prefix}/{os.path.basename(results_file)}", RETRAIN, message, user_name, model_name, metrics, leaderboard_partition(COMPLETE_DATA_S3_URI))
             
 
 if __name__ == "__main__":
@@ -148,4 +208,10 @@ if __name__ == "__main__":
     parser.add_argument('--model_name', type=str, help='The S3 URI of the user ML output CSV.')
 
     args = parser.parse_args()
-    main(args.user_ml_script_s3_uri, args.user_ml_output_csv_s3_uri,args.submission_timestamp,args.email,args.user_name,args.model_name)
\ No newline at end of file
+    # Job log kept next to the script logs so it is published with them
+    os.makedirs(SCRIPT_LOG_DIR, exist_ok=True)
+    job_log_handler = logging.FileHandler(os.path.join(SCRIPT_LOG_DIR, "job.log"))
+    job_log_handler.setLevel(logging.INFO)
+    logging.getLogger().addHandler(job_log_handler)
+    with trace_job("ml-training-job", submission_timestamp=args.submission_timestamp, model_name=args.model_name):
+        main(args.user_ml_script_s3_uri, args.user_ml_output_csv_s3_uri,args.submission_timestamp,args.email,args.user_name,args.model_name)
\ No newline at end of file
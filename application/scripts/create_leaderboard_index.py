@@ -0,0 +1,92 @@
+import argparse
+import logging
+import math
+import os
+import time
+
+import boto3
+
+# Environment variables
+BENCHMARKS_TABLE_NAME = os.environ.get("BENCHMARKS_TABLE", "benchmarks")
+LEADERBOARD_INDEX = os.environ.get("LEADERBOARD_INDEX", "leaderboard-index")
+
+# Initialize AWS clients
+dynamodb_client = boto3.client("dynamodb")
+
+# Logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+def create_index():
+    # Sparse index: only items carrying both leaderboard and sharpe_value are ranked
+    table = dynamodb_client.describe_table(TableName=BENCHMARKS_TABLE_NAME)["Table"]
+    if any(index["IndexName"] == LEADERBOARD_INDEX for index in table.get("GlobalSecondaryIndexes", [])):
+        logger.info(f"{LEADERBOARD_INDEX} already exists on {BENCHMARKS_TABLE_NAME}")
+        return
+
+    index = {
+        "IndexName": LEADERBOARD_INDEX,
+        "KeySchema": [
+            {"AttributeName": "leaderboard", "KeyType": "HASH"},
+            {"AttributeName": "sharpe_value", "KeyType": "RANGE"},
+        ],
+        "Projection": {"ProjectionType": "ALL"},
+    }
+    if table.get("BillingModeSummary", {}).get("BillingMode") != "PAY_PER_REQUEST":
+        throughput = table["ProvisionedThroughput"]
+        index["ProvisionedThroughput"] = {
+            "ReadCapacityUnits": throughput["ReadCapacityUnits"],
+            "WriteCapacityUnits": throughput["WriteCapacityUnits"],
+        }
+
+    dynamodb_client.update_table(
+        TableName=BENCHMARKS_TABLE_NAME,
+        AttributeDefinitions=[
+            {"AttributeName": "leaderboard", "AttributeType": "S"},
+            {"AttributeName": "sharpe_value", "AttributeType": "N"},
+        ],
+        GlobalSecondaryIndexUpdates=[{"Create": index}],
+    )
+    logger.info(f"Creating {LEADERBOARD_INDEX} on {BENCHMARKS_TABLE_NAME}")
+
+def wait_for_index():
+    while True:
+        table = dynamodb_client.describe_table(TableName=BENCHMARKS_TABLE_NAME)["Table"]
+        status = next(index["IndexStatus"] for index in table["GlobalSecondaryIndexes"] if index["IndexName"] == LEADERBOARD_INDEX)
+        if status == "ACTIVE":
+            return
+        logger.info(f"{LEADERBOARD_INDEX} is {status}, waiting")
+        time.sleep(30)
+
+def backfill(dataset_year, overwrite):
+    # Benchmarks scored before the index existed only carry the string sharpe
+    updated = 0
+    for page in dynamodb_client.get_paginator("scan").paginate(TableName=BENCHMARKS_TABLE_NAME):
+        for item in page["Items"]:
+            if "leaderboard" in item and not overwrite:
+                continue
+            try:
+                sharpe_value = float(item.get("sharpe", {}).get("S", "nan"))
+            except ValueError:
+                continue
+            if not math.isfinite(sharpe_value):
+                continue
+            dynamodb_client.update_item(
+                TableName=BENCHMARKS_TABLE_NAME,
+                Key={"email": item["email"], "submission_timestamp": item["submission_timestamp"]},
+                UpdateExpression="SET leaderboard = :leaderboard, sharpe_value = :sharpe_value",
+                ExpressionAttributeValues={":leaderboard": {"S": dataset_year}, ":sharpe_value": {"N": repr(sharpe_value)}},
+            )
+            updated += 1
+    logger.info(f"Backfilled {updated} benchmarks into leaderboard {dataset_year}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Create the benchmarks leaderboard index and backfill existing results")
+    parser.add_argument("--dataset_year", default="2024", help="Leaderboard existing benchmarks were scored on")
+    parser.add_argument("--overwrite", action="store_true", help="Also re-rank benchmarks that already have a leaderboard")
+    args = parser.parse_args()
+
+    create_index()
+    wait_for_index()
+    backfill(args.dataset_year, args.overwrite)
@@ -1,4 +1,22 @@
 def export_data(pf):
     """ Placeholder function for data exporting. """
+    import os
     import pandas as pd
-    pf.to_csv('data/training_results.csv', index=False)
+    output_format = os.environ.get("OUTPUT_FORMAT", "csv")
+    if output_format == "csv":
+        pf.to_csv('data/training_results.csv', index=False)
+        return
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+    if all(col in pf.columns for col in ("id", "eom", "w")):
+        # Fixed schema so every reader sees the same column types
+        schema = pa.schema([("id", pa.int64()), ("eom", pa.timestamp("ns")), ("w", pa.float64())])
+        table = pa.Table.from_pandas(pf[["id", "eom", "w"]].assign(eom=pd.to_datetime(pf["eom"])), schema=schema, preserve_index=False)
+    else:
+        # Written as-is so the validator reports the missing columns
+        table = pa.Table.from_pandas(pf, preserve_index=False)
+    if output_format == "parquet":
+        pq.write_table(table, 'data/training_results.parquet')
+    else:
+        feather.write_feather(table, 'data/training_results.arrow')
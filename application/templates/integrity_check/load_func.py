@@ -1,7 +1,20 @@
 def load_data()->(str): 
     """ Placeholder function for data loading. """
+    import os
     import pandas as pd
-    features = pd.read_parquet("integrity-check/ctff_features_integrity.parquet")['features']
-    chars = pd.read_parquet("integrity-check/ctff_chars_integrity.parquet")
-    daily_ret = pd.read_parquet("integrity-check/ctff_daily_ret.parquet")
-    return features, chars,daily_ret
+    import pyarrow as pa
+    def read_parquet(path):
+        # Prefer the uncompressed Arrow IPC copy made at staging: it is memory-mapped, so reading it
+        # skips parquet decoding. The frame is copied out of the map so scripts can modify it;
+        # ARROW_ZERO_COPY=True keeps it on the read-only mapped pages instead.
+        arrow_path = os.path.splitext(path)[0] + ".arrow"
+        if os.path.exists(arrow_path):
+            table = pa.ipc.open_file(pa.memory_map(arrow_path)).read_all()
+            if os.environ.get("ARROW_ZERO_COPY", "False") == "True":
+                return table.to_pandas(split_blocks=True)
+            return table.to_pandas()
+        return pd.read_parquet(path)
+    features = read_parquet("integrity-check/ctff_features_integrity.parquet")['features']
+    chars = read_parquet("integrity-check/ctff_chars_integrity.parquet")
+    daily_ret = read_parquet("integrity-check/ctff_daily_ret.parquet")
+    return features, chars, daily_ret
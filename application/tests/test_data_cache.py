@@ -0,0 +1,40 @@
+import os
+import stat
+
+from utils import data_cache
+
+
+def _cache_blob(cache_dir, content=b"PAR1 original bytes"):
+    def fetch_many(pending):
+        for _, tmp_path in pending:
+            with open(tmp_path, "wb") as file:
+                file.write(content)
+    blob, = data_cache.insert_many([("bucket", "complete/2024/ctff_chars.parquet", '"etag"', len(content))], fetch_many, cache_dir=cache_dir)
+    return blob
+
+
+def test_rewriting_the_working_copy_leaves_the_blob_intact(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    blob = _cache_blob(cache_dir)
+    local_path = str(tmp_path / "job" / "data" / "ctff_chars.parquet")
+    data_cache.materialize(blob, local_path)
+
+    assert not os.path.samefile(blob, local_path)
+    with open(local_path, "r+b") as file:
+        file.write(b"XXXX")
+    with open(blob, "rb") as file:
+        assert file.read() == b"PAR1 original bytes"
+    assert data_cache.lookup("bucket", "complete/2024/ctff_chars.parquet", '"etag"', 19, cache_dir=cache_dir) == blob
+
+
+def test_cached_blobs_are_read_only(tmp_path):
+    blob = _cache_blob(str(tmp_path / "cache"))
+    assert not os.stat(blob).st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+
+
+def test_cache_inside_the_working_directory_is_disabled(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(data_cache, "DATA_CACHE_DIR", str(tmp_path / "cache"))
+    assert not data_cache.cache_enabled()
+    monkeypatch.setattr(data_cache, "DATA_CACHE_DIR", str(tmp_path.parent / "elsewhere"))
+    assert data_cache.cache_enabled()
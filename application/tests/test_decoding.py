@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+from utils import decoding
+
+# Text and complete escapes, so any concatenation decodes
+VALID_FRAGMENTS = [
+    'n', 'r', 't', '/', '"', 'a', '7', ' ', 'x', 'u', 'N', '{', '}', '\n', '\r\n', 'é',
+    '\\n', '\\t', '\\/', '\\r\\n', '\\x41', '\\u00e9', '\\N{BULLET}', '\\\\',
+]
+# Plus lone backslashes, which also form invalid escapes
+FRAGMENTS = VALID_FRAGMENTS + ['\\', '\\']
+
+
+def baseline_decode_file(file_name):
+    # The whole-file decode used before streaming, kept as the reference
+    with open(file_name, 'r') as file:
+        code_str = file.read()
+    if code_str.startswith('"') and code_str.endswith('"'):
+        code_str = code_str[1:-1]
+    normal_code = code_str.replace(r'\r\n', '\n').replace(r'\n', '\n').replace(r'\/', '/').replace(r'\t', '\t').encode().decode('unicode_escape')
+    with open(file_name, 'w') as file:
+        file.write(normal_code)
+
+
+def _outcome(func):
+    try:
+        return func()
+    except UnicodeDecodeError:
+        return UnicodeDecodeError
+
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")
+def test_streamed_decode_matches_whole_file_decode(tmp_path, monkeypatch):
+    rng = random.Random(0)
+    for _ in range(3000):
+        fragments = VALID_FRAGMENTS if rng.random() < 0.5 else FRAGMENTS
+        text = "".join(rng.choice(fragments) for _ in range(rng.randint(0, 400)))
+        if rng.random() < 0.3:
+            text = f'"{text}"'
+        # Plain files without a backslash are left as they are instead of round-tripping non-ASCII text
+        if not (text.startswith('"') and text.endswith('"')) and '\\' not in text:
+            continue
+        monkeypatch.setattr(decoding, "DECODE_CHUNK_CHARS", rng.randint(1, 300))
+        outcomes = []
+        for name, decode in (("baseline", baseline_decode_file), ("streamed", decoding.decode_file)):
+            path = tmp_path / name
+            with open(path, "w") as file:
+                file.write(text)
+            outcomes.append(_outcome(lambda: (decode(str(path)), path.read_bytes())[1]))
+        assert outcomes[0] == outcomes[1], repr(text)
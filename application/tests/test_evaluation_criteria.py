@@ -0,0 +1,60 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+
+from utils.evalution_criteria import EvaluationContext, calculate_metrics, calculate_sharpe_ratio
+
+
+def baseline_sharpe(chars_file, output_file):
+    # The merge-based score the evaluation had before the return index, kept as the reference
+    chars = pd.read_parquet(chars_file)
+    pf = pd.read_csv(output_file)
+    sharpe_df = pd.merge(
+        pf.assign(
+            id=pf['id'].astype('int64'),
+            eom=pd.to_datetime(pf['eom']),
+            w=pf['w'].astype('float64')
+        )[['id', 'eom', 'w']],
+        chars.assign(
+            id=chars['id'].astype('int64'),
+            eom=pd.to_datetime(chars['eom']),
+            ret_exc_lead1m=chars['ret_exc_lead1m'].astype('float64')
+        )[['id', 'eom', 'ret_exc_lead1m']],
+        on=['id', 'eom'],
+        how='left'
+    )
+    sharpe_df['w_ret'] = sharpe_df['w'] * sharpe_df['ret_exc_lead1m']
+    rets = sharpe_df.groupby('eom')['w_ret'].sum()
+    return str(rets.mean() / rets.std())
+
+
+def _write_inputs(tmp_path, seed):
+    rng = np.random.default_rng(seed)
+    ids = rng.choice(np.arange(10_000, 99_999), size=300, replace=False)
+    months = pd.date_range("2000-01-31", periods=60, freq=pd.offsets.MonthEnd())
+    chars = pd.DataFrame([(i, m) for i in ids for m in months], columns=["id", "eom"])
+    chars["ret_exc_lead1m"] = rng.normal(0.01, 0.1, len(chars))
+    chars.loc[rng.random(len(chars)) < 0.05, "ret_exc_lead1m"] = np.nan
+    chars["ctff_test"] = True
+    # Some chars rows are missing, so part of the weights find no return
+    chars = chars[rng.random(len(chars)) > 0.05]
+    chars.sample(frac=1.0, random_state=seed).to_parquet(tmp_path / "chars.parquet")
+
+    pf = pd.DataFrame([(i, m) for i in ids for m in months], columns=["id", "eom"]).sample(frac=1.0, random_state=seed)
+    pf["w"] = rng.normal(0.0, 1.0 / len(ids), len(pf))
+    pf["eom"] = pf["eom"].dt.strftime("%Y-%m-%d")
+    pf.to_csv(tmp_path / "training_results.csv", index=False)
+    return str(tmp_path / "chars.parquet"), str(tmp_path / "training_results.csv")
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_sharpe_is_bit_identical_to_the_merge_score(tmp_path, seed):
+    chars_file, output_file = _write_inputs(tmp_path, seed)
+    expected = baseline_sharpe(chars_file, output_file)
+
+    assert calculate_sharpe_ratio(output_file, context=EvaluationContext(chars_file)) == (True, expected)
+    is_valid, metrics = calculate_metrics(output_file, context=EvaluationContext(chars_file))
+    assert is_valid
+    assert str(metrics["sharpe"]) == expected
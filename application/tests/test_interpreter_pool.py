@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+APPLICATION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+USER_SCRIPT = "import numpy as np\nprint(np.random.random())\n"
+
+# Stands in for run.py: every execution of its module level is recorded
+MAIN = textwrap.dedent("""
+    import os, sys
+    with open("main_runs", "a") as file:
+        file.write(__name__ + "\\n")
+    sys.path.insert(0, sys.argv[1])
+    from utils import interpreter_pool
+    if __name__ == "__main__":
+        interpreter_pool.PRELOAD_MODULES[:] = ["numpy"]
+        interpreter_pool.start()
+        for _ in range(2):
+            returncode, stdout, stderr, reason, peak_rss_mb = interpreter_pool.run_forked("user_script.py")
+            assert returncode == 0, stderr
+            print(stdout.strip())
+""")
+
+
+def test_children_skip_main_module_and_draw_fresh_seeds(tmp_path):
+    pytest.importorskip("numpy")
+    (tmp_path / "user_script.py").write_text(USER_SCRIPT)
+    (tmp_path / "job.py").write_text(MAIN)
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    result = subprocess.run([sys.executable, "job.py", APPLICATION_DIR], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+
+    assert (tmp_path / "main_runs").read_text().split() == ["__main__"]
+    first, second = result.stdout.split()
+    assert first != second
@@ -0,0 +1,49 @@
+import ast
+import os
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+pd = pytest.importorskip("pandas")
+
+from utils import staging
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+COMPLETE_DATA_FILES = ["data/ctff_features.parquet", "data/ctff_chars.parquet", "data/ctff_daily_ret.parquet"]
+
+
+def _load_data(template):
+    namespace = {}
+    with open(os.path.join(TEMPLATES_DIR, template, "load_func.py")) as file:
+        exec(compile(ast.parse(file.read()), template, "exec"), namespace)
+    return namespace["load_data"]
+
+
+def _stage(tmp_path, with_arrow):
+    tables = {
+        "data/ctff_features.parquet": pa.table({"features": ["c1", "c2"]}),
+        "data/ctff_chars.parquet": pa.table({"id": [1, 2, 3], "c1": [0.5, 0.95, 0.99], "c2": [0.1, 0.2, 0.3]}),
+        "data/ctff_daily_ret.parquet": pa.table({"id": [1, 2, 3], "ret_exc": [0.01, -0.02, 0.03]}),
+    }
+    for path, table in tables.items():
+        full_path = tmp_path / path
+        full_path.parent.mkdir(exist_ok=True)
+        pq.write_table(table, str(full_path))
+        if with_arrow:
+            staging._write_arrow(str(full_path), staging.arrow_path(str(full_path)))
+
+
+@pytest.mark.parametrize("with_arrow", [True, False])
+def test_loaded_frames_are_writable(tmp_path, monkeypatch, with_arrow):
+    _stage(tmp_path, with_arrow)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("ARROW_ZERO_COPY", raising=False)
+
+    features, chars, daily_ret = _load_data("complete_data")()
+    chars.loc[chars.c1 > 0.9, 'c1'] = 0.9
+    daily_ret["ret_exc"] *= 2
+
+    assert list(features) == ["c1", "c2"]
+    assert chars["c1"].tolist() == [0.5, 0.9, 0.9]
+    assert daily_ret["ret_exc"].tolist() == [0.02, -0.04, 0.06]
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+pd = pytest.importorskip("pandas")
+
+from utils.output_validation import validate_output_file
+
+ROWS = 10_000
+
+
+def _table():
+    return pa.table({
+        "id": list(range(ROWS)),
+        "eom": pd.date_range("2000-01-31", periods=ROWS, freq="D"),
+        "w": [1.0 / ROWS] * ROWS,
+    })
+
+
+def _corrupt_body(path):
+    # Overwrites the data pages but keeps the footer, so the header still reads
+    size = os.path.getsize(path)
+    with open(path, "r+b") as file:
+        file.seek(64)
+        file.write(b"\xff" * (size // 2))
+
+
+def test_valid_parquet_passes(tmp_path):
+    path = str(tmp_path / "training_results.parquet")
+    pq.write_table(_table(), path)
+    assert validate_output_file(path) == (True, "Required Columns Check Passed!")
+
+
+def test_truncated_parquet_is_a_failed_check(tmp_path):
+    path = str(tmp_path / "training_results.parquet")
+    pq.write_table(_table(), path)
+    with open(path, "r+b") as file:
+        file.truncate(os.path.getsize(path) // 2)
+    passed, message = validate_output_file(path)
+    assert not passed
+    assert "not a valid parquet file" in message
+
+
+def test_corrupt_parquet_body_is_a_failed_check(tmp_path):
+    path = str(tmp_path / "training_results.parquet")
+    pq.write_table(_table(), path, row_group_size=1000)
+    _corrupt_body(path)
+    passed, message = validate_output_file(path)
+    assert not passed
+    assert "not a valid parquet file" in message
+
+
+def test_corrupt_arrow_body_is_a_failed_check(tmp_path):
+    path = str(tmp_path / "training_results.arrow")
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, _table().schema) as writer:
+            writer.write_table(_table(), max_chunksize=1000)
+    _corrupt_body(path)
+    passed, message = validate_output_file(path)
+    assert not passed
+    assert "not a valid arrow file" in message
+
+
+def test_default_cap_rejects_leveraged_month(tmp_path):
+    path = str(tmp_path / "training_results.parquet")
+    table = _table().set_column(2, "w", pa.array([0.0] * (ROWS - 1) + [25.0]))
+    pq.write_table(table, path)
+    is_valid, message = validate_output_file(path)
+    assert not is_valid
+    assert "exceeds 10.0" in message
@@ -0,0 +1,50 @@
+import ast
+import textwrap
+
+from utils.replace_func import apply_templates
+
+SCRIPT = textwrap.dedent('''
+    def load_data():
+        return "user"
+
+    def helper():
+        def load_data():
+            return "nested"
+        if __name__ == "__main__":
+            print("main inside a function")
+        return load_data()
+
+    if True:
+        def load_data():
+            return "inside if"
+        if __name__ == "__main__":
+            print("main inside an if")
+
+    if __name__ == "__main__":
+        print("user main")
+''')
+
+
+def _templates(tmp_path):
+    load = tmp_path / "load_func.py"
+    load.write_text('def load_data():\n    return "template"\n')
+    main = tmp_path / "main_block.py"
+    main.write_text('if __name__ == "__main__":\n    print("template main")\n')
+    return {"load_data": str(load)}, str(main)
+
+
+def test_replacements_keep_the_original_scope(tmp_path):
+    mapping, main_block = _templates(tmp_path)
+    tree = ast.parse(SCRIPT)
+    rendered = ast.unparse(apply_templates(tree, mapping, main_block))
+
+    # Functions are replaced everywhere but inside other functions
+    assert rendered.count("return 'template'") == 2
+    assert "return 'nested'" in rendered
+    assert "return 'user'" not in rendered and "return 'inside if'" not in rendered
+    # The __main__ block is replaced everywhere but inside another if
+    assert rendered.count("print('template main')") == 2
+    assert "print('main inside an if')" in rendered
+    assert "print('user main')" not in rendered and "print('main inside a function')" not in rendered
+    # The parsed script is left untouched for the next variant
+    assert ast.unparse(tree) == ast.unparse(ast.parse(SCRIPT))
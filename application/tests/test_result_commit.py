@@ -0,0 +1,107 @@
+import pytest
+
+moto = pytest.importorskip("moto")
+
+from utils import aws_clients, result_commit
+
+EMAIL = "user@example.com"
+
+
+@pytest.fixture
+def dynamodb(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.delenv("AWS_BATCH_JOB_ID", raising=False)
+    with moto.mock_aws():
+        aws_clients._reset()
+        client = aws_clients.get_client("dynamodb")
+        for table in (result_commit.SUBMISSIONS_TABLE, result_commit.BENCHMARKS_TABLE):
+            client.create_table(
+                TableName=table,
+                KeySchema=[{"AttributeName": "email", "KeyType": "HASH"}, {"AttributeName": "submission_timestamp", "KeyType": "RANGE"}],
+                AttributeDefinitions=[{"AttributeName": "email", "AttributeType": "S"}, {"AttributeName": "submission_timestamp", "AttributeType": "S"}],
+                BillingMode="PAY_PER_REQUEST",
+            )
+        yield client
+    aws_clients._reset()
+
+
+def _get(client, table, key):
+    return client.get_item(TableName=table, Key=key).get("Item")
+
+
+def _version(client):
+    item = _get(client, result_commit.BENCHMARKS_TABLE, result_commit.BENCHMARKS_VERSION_KEY)
+    return int(item["version"]["N"]) if item else 0
+
+
+def test_commit_writes_both_items_and_bumps_version(dynamodb, monkeypatch):
+    monkeypatch.setenv("AWS_BATCH_JOB_ID", "job-1")
+    result_commit.commit_result(EMAIL, "100", "weights/a.csv", False, "0.5", "user", "model", {"sharpe": 0.5}, "2024")
+
+    key = {"email": {"S": EMAIL}, "submission_timestamp": {"S": "100"}}
+    benchmark = _get(dynamodb, result_commit.BENCHMARKS_TABLE, key)
+    assert benchmark["sharpe"] == {"S": "0.5"}
+    assert benchmark["metrics"] == {"M": {"sharpe": {"S": "0.5"}}}
+    assert benchmark["leaderboard"] == {"S": "2024"}
+    assert benchmark["sharpe_value"] == {"N": "0.5"}
+    retrain_list = _get(dynamodb, result_commit.SUBMISSIONS_TABLE, key)["retrain_list"]["L"]
+    assert [record["M"]["weights"] for record in retrain_list] == [{"S": "weights/a.csv"}]
+    assert _version(dynamodb) == 1
+
+    # A non-finite Sharpe from a later retrain takes the benchmark off the leaderboard
+    monkeypatch.setenv("AWS_BATCH_JOB_ID", "job-2")
+    result_commit.commit_result(EMAIL, "100", "weights/b.csv", True, "nan", "user", "model", None, "2024")
+    benchmark = _get(dynamodb, result_commit.BENCHMARKS_TABLE, key)
+    assert "leaderboard" not in benchmark and "sharpe_value" not in benchmark
+    assert len(_get(dynamodb, result_commit.SUBMISSIONS_TABLE, key)["retrain_list"]["L"]) == 2
+    assert _version(dynamodb) == 2
+
+
+def test_request_token_follows_the_batch_job(monkeypatch):
+    monkeypatch.delenv("AWS_BATCH_JOB_ID", raising=False)
+    assert result_commit.job_request_token() is None
+
+    monkeypatch.setenv("AWS_BATCH_JOB_ID", "6f6d4a52-0c8e-4e3c-9c35-2f5a7d1b9e10")
+    monkeypatch.setenv("AWS_BATCH_JOB_ATTEMPT", "1")
+    first = result_commit.job_request_token()
+    assert len(first) == 36
+    assert result_commit.job_request_token() == first
+    monkeypatch.setenv("AWS_BATCH_JOB_ATTEMPT", "2")
+    assert result_commit.job_request_token() != first
+
+
+def test_idempotent_parameter_mismatch_is_not_retried(monkeypatch):
+    calls = []
+
+    class Client:
+        def transact_write_items(self, **params):
+            calls.append(params)
+            raise result_commit.ClientError({"Error": {"Code": "IdempotentParameterMismatchException"}}, "TransactWriteItems")
+
+    monkeypatch.setattr(result_commit, "get_client", lambda service_name: Client())
+    with pytest.raises(result_commit.IdempotentParameterMismatch):
+        result_commit.transact([result_commit.benchmark_update(EMAIL, "100", "0.5")], "token")
+    assert len(calls) == 1
+
+
+def test_version_bump_failure_is_ignored(dynamodb, monkeypatch):
+    monkeypatch.setattr(result_commit, "BENCHMARKS_TABLE", "missing")
+    result_commit.bump_benchmarks_version()
+
+
+def test_batch_committer_chunks_transactions(dynamodb, monkeypatch):
+    sizes = []
+    transact = result_commit.transact
+    monkeypatch.setattr(result_commit, "transact", lambda actions, token=None: (sizes.append(len(actions)), transact(actions, token)))
+
+    with result_commit.BatchCommitter(max_items=3) as committer:
+        for timestamp in range(7):
+            committer.add([result_commit.benchmark_update(EMAIL, str(timestamp), "0.1")])
+        # The same item twice cannot share a transaction
+        committer.add([result_commit.benchmark_update(EMAIL, "6", "0.2")])
+
+    assert sizes == [3, 3, 1, 1]
+    assert committer.committed == 8
+    assert _get(dynamodb, result_commit.BENCHMARKS_TABLE, {"email": {"S": EMAIL}, "submission_timestamp": {"S": "6"}})["sharpe"] == {"S": "0.2"}
+    assert _version(dynamodb) == 4
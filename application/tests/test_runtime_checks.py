@@ -0,0 +1,45 @@
+import os
+import resource
+
+from utils import resource_limits, runtime_checks
+
+
+def _script(tmp_path, source):
+    path = tmp_path / "script.py"
+    path.write_text(source)
+    return str(path)
+
+
+def test_failure_reason_carries_stderr_tail(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    script = _script(tmp_path, "print('loading')\nraise ValueError('bad weights')\n")
+
+    is_valid, message = runtime_checks.run_script(script, phase="integrity_check")
+
+    assert not is_valid
+    assert "ValueError: bad weights" in message
+    assert "loading" in message
+
+
+def test_limits_are_applied_in_the_script_process(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("SCRIPT_MAX_ADDRESS_SPACE_MB", "4096")
+    script = _script(tmp_path, "import os, resource\nprint(resource.getrlimit(resource.RLIMIT_AS)[0], os.getsid(0) == os.getpid())\n")
+
+    is_valid, _ = runtime_checks.run_script(script, phase="integrity_check")
+
+    assert is_valid
+    with open(os.path.join(runtime_checks.SCRIPT_LOG_DIR, "integrity_check.stdout.log")) as file:
+        assert file.read().split() == [str(4096 * 1024 ** 2), "True"]
+    # The job process itself is left unlimited
+    assert resource.getrlimit(resource.RLIMIT_AS)[0] != 4096 * 1024 ** 2
+
+
+def test_configured_cores_are_pinned(monkeypatch):
+    allowed = sorted(os.sched_getaffinity(0))
+    monkeypatch.setenv("SCRIPT_CPUS", f"{allowed[0]},100000")
+
+    assert resource_limits.ResourceLimits.for_phase("complete_training").cpus == [allowed[0]]
+
+    monkeypatch.setenv("SCRIPT_CPU_PINNING", "False")
+    assert resource_limits.ResourceLimits.for_phase("complete_training").cpus is None
@@ -0,0 +1,57 @@
+import os
+import shutil
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from utils import data_cache, staging
+
+ROWS = 200_000
+
+
+def _write_parquet(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # More rows than one iter_batches() batch, so a batch-by-batch copy would chunk every column
+    table = pa.table({"id": list(range(ROWS)), "ret": [i / ROWS for i in range(ROWS)]})
+    pq.write_table(table, path, row_group_size=50_000)
+
+
+def test_converted_entry_never_shares_a_blob_with_its_source(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_cache, "DATA_CACHE_DIR", str(tmp_path / "cache"))
+    source = str(tmp_path / "data")
+    key = "complete/2024/ctff_chars.parquet"
+    parquet_path = os.path.join(source, "ctff_chars.parquet")
+    _write_parquet(parquet_path)
+    etag, size = '"abc123"', os.path.getsize(parquet_path)
+
+    # The staged parquet object is cached first, as download_from_s3 does
+    def fetch_many(pending):
+        for _, tmp_path_ in pending:
+            shutil.copyfile(parquet_path, tmp_path_)
+    parquet_blob, = data_cache.insert_many([("bucket", key, etag, size)], fetch_many)
+
+    staging.convert_to_arrow("s3://bucket/complete/2024/", source, [(key, etag, size)])
+    arrow_file = staging.arrow_path(parquet_path)
+
+    with open(arrow_file, "rb") as file:
+        assert file.read(6) == b"ARROW1"
+    assert not os.path.samefile(arrow_file, parquet_blob)
+    with open(parquet_blob, "rb") as file:
+        assert file.read(4) == b"PAR1"
+
+
+def test_arrow_copy_is_one_record_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_cache, "DATA_CACHE_DIR", "")
+    source = str(tmp_path / "data")
+    parquet_path = os.path.join(source, "ctff_chars.parquet")
+    _write_parquet(parquet_path)
+
+    staging.convert_to_arrow("s3://bucket/complete/2024/", source, [("complete/2024/ctff_chars.parquet", '"abc123"', 0)])
+
+    reader = pa.ipc.open_file(pa.memory_map(staging.arrow_path(parquet_path)))
+    assert reader.num_record_batches == 1
+    table = reader.read_all()
+    assert table.num_rows == ROWS
+    assert all(column.num_chunks == 1 for column in table.columns)
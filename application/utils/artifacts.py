@@ -0,0 +1,139 @@
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.s3.transfer import TransferConfig
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from utils.aws_clients import get_client
+from utils.s3_transfer import S3_DOWNLOAD_CONCURRENCY, S3_PART_SIZE, with_retries
+
+# "gzip" or "zstd" stores artifacts compressed with a matching Content-Encoding; empty uploads them as-is
+ARTIFACT_CONTENT_ENCODING = os.environ.get("ARTIFACT_CONTENT_ENCODING", "")
+ARTIFACT_UPLOAD_CONCURRENCY = int(os.environ.get("ARTIFACT_UPLOAD_CONCURRENCY", "8"))
+MANIFEST_NAME = "manifest.json"
+
+READ_CHUNK_SIZE = 1024 ** 2
+# Parquet is compressed internally; gzip/zstd uploads already are
+COMPRESSED_MAGICS = (b"PAR1", b"\x1f\x8b", b"\x28\xb5\x2f\xfd")
+
+
+class Artifact:
+    """ A local file and the key it is published under """
+    def __init__(self, name, path, key):
+        self.name = name
+        self.path = path
+        self.key = key
+
+
+def _already_compressed(path):
+    with open(path, "rb") as file:
+        magic = file.read(4)
+    return any(magic.startswith(m) for m in COMPRESSED_MAGICS)
+
+
+def _open_encoder(encoding, target):
+    if encoding == "gzip":
+        # mtime=0 keeps the stored bytes identical for identical content
+        return gzip.GzipFile(filename="", mode="wb", fileobj=target, mtime=0)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("ARTIFACT_CONTENT_ENCODING is zstd but the zstandard package is not installed")
+        return zstandard.ZstdCompressor(level=3).stream_writer(target, closefd=False)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def _prepare(path, encoding, tmp_dir):
+    # One read of the source both hashes it and, when encoding, writes the compressed copy.
+    # Returns (sha256 of the original content, path to upload).
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        if not encoding:
+            for block in iter(lambda: source.read(READ_CHUNK_SIZE), b""):
+                digest.update(block)
+            return digest.hexdigest(), path
+
+        upload_path = os.path.join(tmp_dir, hashlib.sha1(path.encode()).hexdigest())
+        with open(upload_path, "wb") as target:
+            with _open_encoder(encoding, target) as encoder:
+                for block in iter(lambda: source.read(READ_CHUNK_SIZE), b""):
+                    digest.update(block)
+                    encoder.write(block)
+    return digest.hexdigest(), upload_path
+
+
+class ArtifactPublisher:
+    """ Uploads the files of one submission concurrently and records them in a manifest """
+    def __init__(self, bucket_name, content_encoding=None):
+        self.bucket_name = bucket_name
+        self.content_encoding = ARTIFACT_CONTENT_ENCODING if content_encoding is None else content_encoding
+        self.s3 = get_client('s3')
+        self.transfer_config = TransferConfig(
+            multipart_threshold=S3_PART_SIZE,
+            multipart_chunksize=S3_PART_SIZE,
+            max_concurrency=max(1, S3_DOWNLOAD_CONCURRENCY // ARTIFACT_UPLOAD_CONCURRENCY),
+        )
+        self.entries = []
+
+    def _upload(self, artifact, tmp_dir):
+        encoding = "" if _already_compressed(artifact.path) else self.content_encoding
+        sha256, upload_path = _prepare(artifact.path, encoding, tmp_dir)
+
+        extra_args = {"Metadata": {"sha256": sha256}}
+        content_type = mimetypes.guess_type(artifact.path)[0]
+        if content_type:
+            extra_args["ContentType"] = content_type
+        if encoding:
+            extra_args["ContentEncoding"] = encoding
+
+        with_retries(
+            lambda: self.s3.upload_file(upload_path, self.bucket_name, artifact.key, ExtraArgs=extra_args, Config=self.transfer_config),
+            f"PUT s3://{self.bucket_name}/{artifact.key}"
+        )
+        return {
+            "name": artifact.name,
+            "key": artifact.key,
+            "size": os.path.getsize(artifact.path),
+            "stored_size": os.path.getsize(upload_path),
+            "sha256": sha256,
+            "content_encoding": encoding or None,
+            "content_type": content_type,
+        }
+
+    def publish(self, artifacts):
+        # Every upload is attempted; the first failure is raised once all have finished
+        artifacts = [artifact for artifact in artifacts if os.path.exists(artifact.path)]
+        if not artifacts:
+            return []
+        started = time.monotonic()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with ThreadPoolExecutor(max_workers=min(len(artifacts), ARTIFACT_UPLOAD_CONCURRENCY)) as executor:
+                futures = [executor.submit(self._upload, artifact, tmp_dir) for artifact in artifacts]
+            errors = [future.exception() for future in futures if future.exception()]
+            if errors:
+                raise errors[0]
+        entries = [future.result() for future in futures]
+        self.entries.extend(entries)
+
+        stored = sum(entry["stored_size"] for entry in entries)
+        original = sum(entry["size"] for entry in entries)
+        logging.info(f"Published {len(entries)} artifacts ({original} bytes, {stored} stored) in {time.monotonic() - started:.1f}s")
+        return entries
+
+    def write_manifest(self, key, **attributes):
+        manifest = {**attributes, "bucket": self.bucket_name, "created_at": int(time.time()), "artifacts": self.entries}
+        with_retries(
+            lambda: self.s3.put_object(Bucket=self.bucket_name, Key=key, Body=json.dumps(manifest, indent=2).encode(), ContentType="application/json"),
+            f"PUT s3://{self.bucket_name}/{key}"
+        )
+        return manifest
@@ -0,0 +1,56 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+from utils.s3_transfer import S3_DOWNLOAD_CONCURRENCY
+
+AWS_DEFAULT_REGION = os.environ.get("AWS_DEFAULT_REGION", "us-east-1")
+AWS_MAX_ATTEMPTS = int(os.environ.get("AWS_MAX_ATTEMPTS", "5"))
+AWS_RETRY_MODE = os.environ.get("AWS_RETRY_MODE", "adaptive")
+# Points DynamoDB at e.g. DynamoDB Local for testing; empty uses the regional endpoint
+DYNAMODB_ENDPOINT_URL = os.environ.get("DYNAMODB_ENDPOINT_URL", "")
+
+_lock = threading.Lock()
+_session = None
+_clients = {}
+
+
+def _config():
+    options = {
+        "region_name": AWS_DEFAULT_REGION,
+        # Every parallel S3 transfer draws from one pool, so it is sized to the transfer concurrency
+        "max_pool_connections": S3_DOWNLOAD_CONCURRENCY,
+        "retries": {"max_attempts": AWS_MAX_ATTEMPTS, "mode": AWS_RETRY_MODE},
+    }
+    try:
+        return Config(tcp_keepalive=True, **options)
+    except TypeError:
+        # tcp_keepalive needs botocore >= 1.27.84
+        return Config(**options)
+
+
+def _reset():
+    # Connection pools must not be shared with a forked child (bulk_score workers)
+    global _session
+    _session = None
+    _clients.clear()
+
+
+os.register_at_fork(after_in_child=_reset)
+
+
+def get_client(service_name):
+    # One client per service for the whole process; boto3 clients are thread-safe once created
+    client = _clients.get(service_name)
+    if client is not None:
+        return client
+    with _lock:
+        global _session
+        if service_name not in _clients:
+            if _session is None:
+                _session = boto3.session.Session(region_name=AWS_DEFAULT_REGION)
+            endpoint_url = DYNAMODB_ENDPOINT_URL if service_name == "dynamodb" and DYNAMODB_ENDPOINT_URL else None
+            _clients[service_name] = _session.client(service_name, config=_config(), endpoint_url=endpoint_url)
+        return _clients[service_name]
@@ -1,90 +1,94 @@
-import boto3
 import os
+import time
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 import smtplib
 from datetime import datetime
 import json
+import logging
+
+from utils import data_cache, s3_transfer
+from utils.aws_clients import get_client
 
 AWS_DEFAULT_REGION = os.environ.get("AWS_DEFAULT_REGION","us-east-1")
+SSM_CACHE_TTL_SECONDS = float(os.environ.get("SSM_CACHE_TTL_SECONDS", "300"))
+
+# name -> (value, fetched_at)
+_ssm_cache = {}
+
+def _download_objects(s3, objects, cache):
+    # objects: list of (bucket, key, etag, size, local_path)
+    if not cache or not data_cache.cache_enabled():
+        s3_transfer.download_many(s3, [s3_transfer.DownloadJob(bucket, key, size, local_path, etag) for bucket, key, etag, size, local_path in objects])
+        return
+
+    misses = []
+    for bucket, key, etag, size, local_path in objects:
+        cached_path = data_cache.lookup(bucket, key, etag, size)
+        if cached_path:
+            logging.info(f"Cache hit for s3://{bucket}/{key}")
+            data_cache.materialize(cached_path, local_path)
+        else:
+            logging.info(f"Cache miss for s3://{bucket}/{key}")
+            misses.append((bucket, key, etag, size, local_path))
+    if not misses:
+        return
+
+    def fetch_many(pending):
+        s3_transfer.download_many(s3, [s3_transfer.DownloadJob(bucket, key, size, tmp_path, etag) for (bucket, key, etag, size), tmp_path in pending])
 
-def download_from_s3(s3_uri, local_path):
-    s3 = boto3.client('s3',region_name=AWS_DEFAULT_REGION)
+    cached_paths = data_cache.insert_many([obj[:4] for obj in misses], fetch_many)
+    for obj, cached_path in zip(misses, cached_paths):
+        data_cache.materialize(cached_path, obj[4])
+
+def download_from_s3(s3_uri, local_path, cache=True):
+    # Returns the (key, etag, size) of every object that was staged
+    s3 = get_client('s3')
     bucket, key = s3_uri.replace("s3://", "").split("/", 1)
     
     if not key.endswith('/'):
-        s3.download_file(bucket, key, local_path)
+        head = s3.head_object(Bucket=bucket, Key=key)
+        objects = [(bucket, key, head['ETag'], head['ContentLength'], local_path)]
     else:
         paginator = s3.get_paginator('list_objects_v2')
         pages = paginator.paginate(Bucket=bucket, Prefix=key)
         
+        objects = []
         for page in pages:
             for obj in page.get('Contents', []):
                 file_key = obj['Key']
                 if file_key.endswith('/'):
                     # Skip folders within the folder
                     continue
-                # Create local directories if they do not exist
                 local_file_path = os.path.join(local_path, os.path.relpath(file_key, key))
-                os.makedirs(os.path.dirname(local_file_path), exist_ok=True)
-                s3.download_file(bucket, file_key, local_file_path)
-
-
-def upload_script_to_s3(script_file,output_file, bucket_name, email, submission_timestamp):
-    s3 = boto3.client('s3',region_name=AWS_DEFAULT_REGION)
-    accepted_script_key = f"unprocessed/accepted/{email}/{submission_timestamp}/{script_file}"
-    accepted_output_key = f"unprocessed/accepted/{email}/{submission_timestamp}/{output_file}"
-    s3.upload_file(script_file, bucket_name, accepted_script_key)
-    s3.upload_file(script_file, bucket_name, accepted_output_key)
-
+                objects.append((bucket, file_key, obj['ETag'], obj['Size'], local_file_path))
+    _download_objects(s3, objects, cache)
+    return [(key, etag, size) for _, key, etag, size, _ in objects]
 
-def update_submissions_dynamodb(email, submission_timestamp, script_file, output_file, retrain,sharpe_ratio):
-    dynamodb = boto3.client('dynamodb',region_name=AWS_DEFAULT_REGION)
-    current_date = datetime.now().strftime("%Y/%m")
-    
-    retrain_record = {
-        'weights': {'S': f"unprocessed/trainings/{email}/{submission_timestamp}/train/{current_date}/training_results.csv"},
-        'retrain':retrain,
-        'train_time': {'S': datetime.now().isoformat()},
-        'sharpe_ratio': {'S': sharpe_ratio} 
-    }
-
-    update_expression = "SET retrain_list = list_append(if_not_exists(retrain_list, :empty_list), :retrain_record)"
-    expression_attribute_values = {
-        ':retrain_record': {'L': [retrain_record]},
-        ':empty_list': {'L': []}
-    }
 
-    dynamodb.update_item(
-        TableName='submissions',
-        Key={
-            'email': {'S': email},
-            'submission_timestamp': {'S': submission_timestamp}
-        },
-        UpdateExpression=update_expression,
-        ExpressionAttributeValues=expression_attribute_values
-    )
+def accepted_prefix(email, submission_timestamp):
+    return f"unprocessed/accepted/{email}/{submission_timestamp}"
 
-def upload_weights_to_s3(bucket_name, email, submission_timestamp):
-    s3 = boto3.client('s3',region_name=AWS_DEFAULT_REGION)
+def weights_prefix(email, submission_timestamp):
     prefix = f"unprocessed/trainings/{email}/{submission_timestamp}"
     
     current_date = datetime.now().strftime("%Y/%m")
-    prefix = f"{prefix}/train/{current_date}"
+    return f"{prefix}/train/{current_date}"
 
-    output_key = f"{prefix}/training_results.csv"
-    s3.upload_file('data/training_results.csv', bucket_name, output_key)
-     
 def get_ssm_parameter(name):
-    ssm_client = boto3.client('ssm',region_name=AWS_DEFAULT_REGION)
+    cached = _ssm_cache.get(name)
+    if cached and time.monotonic() - cached[1] < SSM_CACHE_TTL_SECONDS:
+        return cached[0]
+    ssm_client = get_client('ssm')
     response = ssm_client.get_parameter(
         Name=name,
         WithDecryption=True
     )
+    _ssm_cache[name] = (response['Parameter']['Value'], time.monotonic())
     return response['Parameter']['Value']
 
 def send_failure_email(email, message):
-    ses = boto3.client('ses')
+    ses = get_client('ses')
     ses.send_email(
         Source='no-reply@jkpfactors.com',
         Destination={
@@ -101,25 +105,3 @@ def send_failure_email(email, message):
             },
         }
     )
-
-def store_sharpe_ratio_in_dynamodb(sharpe_ratio, submission_timestamp, email, user_name, model_name):
-    dynamodb = boto3.client('dynamodb',region_name=AWS_DEFAULT_REGION)
-    
-    # Define the update expression and attribute values
-    update_expression = "SET sharpe = :s, user_name = :un, model_name = :mn"
-    expression_attribute_values = {
-        ':s': {'S': sharpe_ratio},
-        ':un': {'S': user_name},
-        ':mn': {'S': model_name}
-    }
-    
-    # Perform the update
-    dynamodb.update_item(
-        TableName='benchmarks',
-        Key={
-            'email': {'S': email},
-            'submission_timestamp': {'S': submission_timestamp}
-        },
-        UpdateExpression=update_expression,
-        ExpressionAttributeValues=expression_attribute_values
-    )
\ No newline at end of file
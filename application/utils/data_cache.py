@@ -0,0 +1,173 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+DATA_CACHE_DIR = os.environ.get("DATA_CACHE_DIR", "")
+DATA_CACHE_MAX_BYTES = int(os.environ.get("DATA_CACHE_MAX_GB", "50")) * 1024 ** 3
+
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".lock"
+BLOBS_DIR = "blobs"
+# ioctl that makes a copy-on-write clone of a whole file (XFS with reflink, btrfs)
+FICLONE = 0x40049409
+
+
+def _inside_working_dir(path):
+    # The submitted script runs from the job's working directory and can write anywhere below it
+    working_dir = os.path.realpath(os.getcwd())
+    return os.path.commonpath([os.path.realpath(path), working_dir]) == working_dir
+
+
+def cache_enabled():
+    if not DATA_CACHE_DIR:
+        return False
+    if _inside_working_dir(DATA_CACHE_DIR):
+        logging.warning(f"DATA_CACHE_DIR {DATA_CACHE_DIR} is inside the job working directory, not caching")
+        return False
+    return True
+
+
+@contextmanager
+def _locked_manifest(cache_dir):
+    # Several jobs can share one host, so every manifest update holds an exclusive lock
+    os.makedirs(os.path.join(cache_dir, BLOBS_DIR), exist_ok=True)
+    with open(os.path.join(cache_dir, LOCK_FILE), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            manifest_path = os.path.join(cache_dir, MANIFEST_FILE)
+            try:
+                with open(manifest_path, "r") as file:
+                    manifest = json.load(file)
+            except (FileNotFoundError, ValueError):
+                manifest = {"objects": {}, "blobs": {}}
+            yield manifest
+            tmp_path = manifest_path + ".tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(manifest, file)
+            os.replace(tmp_path, manifest_path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _blob_name(etag, size):
+    return hashlib.sha256(f"{etag.strip(chr(34))}:{size}".encode()).hexdigest()
+
+
+def _blob_path(cache_dir, blob):
+    return os.path.join(cache_dir, BLOBS_DIR, blob)
+
+
+def _blob_is_intact(cache_dir, blob, entry):
+    # Hardlinked copies share the inode, so an in-place write by a job shows up as a size/mtime change
+    try:
+        stat = os.stat(_blob_path(cache_dir, blob))
+    except FileNotFoundError:
+        return False
+    return stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]
+
+
+def _drop_blob(cache_dir, manifest, blob):
+    manifest["blobs"].pop(blob, None)
+    manifest["objects"] = {k: v for k, v in manifest["objects"].items() if v["blob"] != blob}
+    try:
+        os.remove(_blob_path(cache_dir, blob))
+    except FileNotFoundError:
+        pass
+
+
+def _evict(cache_dir, manifest, incoming_bytes, max_bytes, keep=()):
+    used = sum(entry["size"] for entry in manifest["blobs"].values())
+    lru = sorted(manifest["blobs"].items(), key=lambda item: item[1]["last_access"])
+    for blob, entry in lru:
+        if used + incoming_bytes <= max_bytes:
+            break
+        if blob in keep:
+            continue
+        logging.info(f"Evicting cached blob {blob} ({entry['size']} bytes)")
+        _drop_blob(cache_dir, manifest, blob)
+        used -= entry["size"]
+
+
+def materialize(path, local_path):
+    # The job always gets its own copy: with a hardlink, a script rewriting data/ in place would
+    # corrupt the shared blob for every later and concurrent job on the host. A reflink shares
+    # blocks copy-on-write, so it costs no more than the link did; other filesystems get a full copy.
+    os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+    if os.path.exists(local_path):
+        os.remove(local_path)
+    with open(path, "rb") as source, open(local_path, "wb") as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+            return
+        except OSError:
+            pass
+    shutil.copyfile(path, local_path)
+
+
+def lookup(bucket, key, etag, size, cache_dir=None):
+    cache_dir = cache_dir or DATA_CACHE_DIR
+    with _locked_manifest(cache_dir) as manifest:
+        obj = manifest["objects"].get(f"{bucket}/{key}")
+        if obj is None or obj["etag"] != etag or obj["size"] != size:
+            return None
+        blob = obj["blob"]
+        entry = manifest["blobs"].get(blob)
+        if entry is None or not _blob_is_intact(cache_dir, blob, entry):
+            _drop_blob(cache_dir, manifest, blob)
+            return None
+        entry["last_access"] = time.time()
+        return _blob_path(cache_dir, blob)
+
+
+def insert_many(objects, fetch_many, cache_dir=None, max_bytes=None):
+    # objects: list of (bucket, key, etag, size). fetch_many([(obj, tmp_path), ...]) downloads
+    # every missing object into its tmp_path. Returns the cached blob path of each object, in order.
+    cache_dir = cache_dir or DATA_CACHE_DIR
+    max_bytes = DATA_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    paths = []
+    to_fetch = {}
+
+    with _locked_manifest(cache_dir) as manifest:
+        for bucket, key, etag, size in objects:
+            blob = _blob_name(etag, size)
+            paths.append(_blob_path(cache_dir, blob))
+            entry = manifest["blobs"].get(blob)
+            if entry is not None and _blob_is_intact(cache_dir, blob, entry):
+                # Same bytes already cached under another key
+                entry["last_access"] = time.time()
+                manifest["objects"][f"{bucket}/{key}"] = {"etag": etag, "size": size, "blob": blob}
+            elif blob not in to_fetch:
+                to_fetch[blob] = ((bucket, key, etag, size), f"{_blob_path(cache_dir, blob)}.{os.getpid()}.part")
+        keep = {os.path.basename(path) for path in paths}
+        _evict(cache_dir, manifest, sum(obj[3] for obj, _ in to_fetch.values()), max_bytes, keep)
+
+    if not to_fetch:
+        return paths
+    try:
+        fetch_many(list(to_fetch.values()))
+        for blob, (_, tmp_path) in to_fetch.items():
+            os.replace(tmp_path, _blob_path(cache_dir, blob))
+            # Blobs are never written again once cached
+            os.chmod(_blob_path(cache_dir, blob), 0o444)
+    finally:
+        for _, tmp_path in to_fetch.values():
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    with _locked_manifest(cache_dir) as manifest:
+        for blob, ((bucket, key, etag, size), _) in to_fetch.items():
+            stat = os.stat(_blob_path(cache_dir, blob))
+            manifest["blobs"][blob] = {
+                # Derived blobs (e.g. Arrow conversions) differ in size from the object they are keyed on
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "last_access": time.time(),
+            }
+        for bucket, key, etag, size in objects:
+            manifest["objects"][f"{bucket}/{key}"] = {"etag": etag, "size": size, "blob": _blob_name(etag, size)}
+    return paths
@@ -0,0 +1,135 @@
+import gzip
+import logging
+import os
+import shutil
+import tempfile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from utils.output_validation import detect_format
+
+DECODE_CHUNK_CHARS = int(os.environ.get("DECODE_CHUNK_CHARS", str(4 * 1024 * 1024)))
+# Longer than any escape unicode_escape accepts (the longest is a \N{...} character name)
+ESCAPE_WINDOW = 128
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+COMPRESSED_SUFFIXES = (".gz", ".gzip", ".zst", ".zstd")
+
+
+def _replace_file(path, write):
+    # write(file) fills a temp file next to path, which then atomically takes its place
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".decode-")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            write(file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def decompress(path):
+    # Returns the path of the uncompressed file; a .gz/.zst suffix is dropped so readers do not infer compression
+    with open(path, "rb") as file:
+        magic = file.read(4)
+    if magic[:2] == GZIP_MAGIC:
+        open_compressed = lambda: gzip.open(path, "rb")
+    elif magic == ZSTD_MAGIC:
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed but the zstandard package is not installed")
+        open_compressed = lambda: zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    else:
+        return path
+
+    target = path[:-len(os.path.splitext(path)[1])] if path.endswith(COMPRESSED_SUFFIXES) else path
+
+    def write(file):
+        with open_compressed() as source:
+            shutil.copyfileobj(source, file, 1024 * 1024)
+
+    _replace_file(target, write)
+    if target != path:
+        os.remove(path)
+    logging.info(f"Decompressed {path} to {target}")
+    return target
+
+
+def _contains_backslash(path):
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            if b"\\" in block:
+                return True
+    return False
+
+
+def _is_quote_wrapped(path):
+    # '"' is never part of a multi-byte UTF-8 sequence, so the raw bytes decide it
+    with open(path, "rb") as file:
+        first = file.read(1)
+        if not first:
+            return False
+        file.seek(-1, os.SEEK_END)
+        return first == b'"' and file.read(1) == b'"'
+
+
+def _decode_text(text):
+    # Same replacements and escape decoding decode_file has always applied, now per chunk
+    return text.replace(r'\r\n', '\n').replace(r'\n', '\n').replace(r'\/', '/').replace(r'\t', '\t').encode().decode('unicode_escape')
+
+
+def _safe_cut(buf):
+    # Index where buf can be split without an escape or replacement pattern spanning the cut.
+    # Escapes end before the next backslash, so a cut at the start of a backslash run is safe unless
+    # the run is the second half of a literal \r\n; without a backslash nearby any cut is safe.
+    # The last character is always held back so a closing quote can still be dropped at EOF.
+    if len(buf) <= ESCAPE_WINDOW:
+        return 0
+    window_start = len(buf) - ESCAPE_WINDOW
+    offset = buf.find('\\', window_start)
+    if offset == -1:
+        return len(buf) - 1
+    while True:
+        while offset > 0 and buf[offset - 1] == '\\':
+            offset -= 1
+        if offset >= 2 and buf[offset - 2:offset] == '\\r':
+            offset -= 2
+            continue
+        return offset
+
+
+def decode_file(file_name):
+    # Streams escaped uploads (a JSON-encoded script, a quoted CSV...) back to plain text in constant
+    # memory. Returns the path of the decoded file, which differs from file_name for .gz/.zst uploads.
+    file_name = decompress(file_name)
+
+    # Parquet/Arrow uploads are binary and never escaped
+    if detect_format(file_name) != "csv":
+        return file_name
+
+    wrapped = _is_quote_wrapped(file_name)
+    if not wrapped and not _contains_backslash(file_name):
+        logging.info(f"{file_name} is already plain text, skipping decoding")
+        return file_name
+
+    def write(file):
+        with open(file_name, 'r') as source, open(file.fileno(), 'w', closefd=False) as target:
+            # Remove the leading and trailing quotes if they exist
+            if wrapped:
+                source.read(1)
+            carry = ""
+            for chunk in iter(lambda: source.read(DECODE_CHUNK_CHARS), ""):
+                buf = carry + chunk
+                cut = _safe_cut(buf)
+                target.write(_decode_text(buf[:cut]))
+                carry = buf[cut:]
+            if wrapped:
+                carry = carry[:-1]
+            target.write(_decode_text(carry))
+
+    _replace_file(file_name, write)
+    logging.info(f"The file has been successfully decoded to {file_name}")
+    return file_name
@@ -1,77 +1,232 @@
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 
-def check_required_columns(output_file="data/training_results.csv"):
-    df = pd.read_csv(output_file)
-    required_columns = ["id", "eom", "w"]
-    if not all(col in df.columns for col in required_columns):
-        return False, "Output does not contain required columns (id, eom, w)"
-    else:
-        return True, "Required Columns Check Passed!"
-
-def compare_columns(output_file="data/training_results.csv", chars_file="data/ctff_chars.parquet"):
-    
-    chars = pd.read_parquet(chars_file)
-    output = pd.read_csv(output_file)
-        
-    # Filter DataFrames and select relevant columns
-    chars_filtered = chars.loc[chars['ctff_test'] == True, ['id', 'eom']]
-    output_filtered = output[['id', 'eom']]
-
-    # Convert 'output' columns to match 'chars' data types
-    chars_id_dtype = chars_filtered['id'].dtype
-    output_filtered.loc[:, 'id'] = output_filtered['id'].astype(chars_id_dtype)
-
-    # Normalize 'eom' column by converting both to datetime without time components
-    output_filtered.loc[:, 'eom'] = pd.to_datetime(output_filtered['eom']).dt.date
-    chars_filtered.loc[:, 'eom'] = pd.to_datetime(chars_filtered['eom']).dt.date
-
-    # Sort both DataFrames by 'id' and 'eom'
-    output_cols_sorted = output_filtered.sort_values(by=['id', 'eom']).reset_index(drop=True)
-    chars_cols_sorted = chars_filtered.sort_values(by=['id', 'eom']).reset_index(drop=True)
-
-    # Compare the 'id' and 'eom' columns
-    if chars_cols_sorted.equals(output_cols_sorted):
+from utils.keys import pack_keys, unpack_keys
+from utils.output_validation import OutputValidationError, iter_validated_chunks, validate_output_file
+
+def read_chars(chars_file="data/ctff_chars.parquet", columns=("id", "eom"), test_only=False):
+    # Only decode the requested columns; the ctff_test filter is pushed down so
+    # row groups whose statistics exclude test rows are skipped entirely
+    filters = [("ctff_test", "==", True)] if test_only else None
+    table = pq.read_table(chars_file, columns=list(columns), filters=filters)
+    return table.to_pandas()
+
+def normalize_dtypes(df):
+    # int64 id, datetime64 eom and float64 w/returns, converted in place once per load
+    if 'id' in df.columns:
+        df['id'] = df['id'].astype('int64')
+    if 'eom' in df.columns:
+        df['eom'] = pd.to_datetime(df['eom'])
+    for col in ('w', 'ret_exc_lead1m'):
+        if col in df.columns:
+            df[col] = df[col].astype('float64')
+    return df
+
+def concat_chunks(chunks):
+    if not chunks:
+        return pd.DataFrame({'id': pd.Series(dtype='int64'), 'eom': pd.Series(dtype='datetime64[ns]'), 'w': pd.Series(dtype='float64')})
+    return pd.concat(chunks, ignore_index=True)
+
+def read_weights(output_file):
+    # Validated, normalized (id, eom, w) frame; raises OutputValidationError
+    return concat_chunks(list(iter_validated_chunks(output_file)))
+
+class ReturnIndex:
+    """ ret_exc_lead1m sorted by packed (id, eom) key, joined to weights with a binary search. """
+
+    def __init__(self, ids, eoms, rets):
+        eoms = np.asarray(eoms, dtype='datetime64[ns]')
+        keys = pack_keys(ids, eoms)
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.eoms = eoms[order]
+        self.rets = np.asarray(rets, dtype='float64')[order]
+        if np.any(self.keys[1:] == self.keys[:-1]):
+            raise ValueError("chars contains duplicate (id, eom) rows")
+
+    @classmethod
+    def from_frame(cls, chars):
+        return cls(chars['id'].to_numpy(), chars['eom'].to_numpy(), chars['ret_exc_lead1m'].to_numpy())
+
+    def lookup(self, ids, eoms):
+        # Same result as a left merge on (id, eom): NaN where the key is absent
+        eoms = np.asarray(eoms, dtype='datetime64[ns]')
+        keys = pack_keys(ids, eoms)
+        if not self.keys.size:
+            return np.full(keys.shape, np.nan)
+        pos = np.minimum(np.searchsorted(self.keys, keys), self.keys.size - 1)
+        # Keys are day-resolution, so also require the exact eom timestamp the merge would have matched
+        found = (self.keys[pos] == keys) & (self.eoms[pos] == eoms)
+        return np.where(found, self.rets[pos], np.nan)
+
+class EvaluationContext:
+    """ Loads each evaluation artifact at most once per job and shares it between checks. """
+
+    def __init__(self, chars_file="data/ctff_chars.parquet"):
+        self.chars_file = chars_file
+        self._outputs = {}
+        self._output_errors = {}
+        self._test_keys = None
+        self._return_index = None
+
+    def weights(self, output_file):
+        # Validated chunk by chunk while loading, so a bad file fails at its first bad chunk
+        if output_file in self._output_errors:
+            raise self._output_errors[output_file]
+        if output_file not in self._outputs:
+            try:
+                self._outputs[output_file] = read_weights(output_file)
+            except OutputValidationError as e:
+                self._output_errors[output_file] = e
+                raise
+        return self._outputs[output_file]
+
+    def test_keys(self):
+        # Sorted packed (id, eom-day) keys of the ctff_test rows
+        if self._test_keys is None:
+            chars = normalize_dtypes(read_chars(self.chars_file, columns=['id', 'eom'], test_only=True))
+            self._test_keys = np.unique(pack_keys(chars['id'].to_numpy(), chars['eom'].to_numpy()))
+        return self._test_keys
+
+    def return_index(self):
+        if self._return_index is None:
+            chars = normalize_dtypes(read_chars(self.chars_file, columns=['id', 'eom', 'ret_exc_lead1m']))
+            self._return_index = ReturnIndex.from_frame(chars)
+        return self._return_index
+
+    def release(self, output_file):
+        self._outputs.pop(output_file, None)
+        self._output_errors.pop(output_file, None)
+
+def check_required_columns(output_file="data/training_results.csv", context=None):
+    # Without a context the file is only streamed through the validator, in bounded memory
+    if context is None:
+        return validate_output_file(output_file)
+    try:
+        context.weights(output_file)
+    except OutputValidationError as e:
+        return False, str(e)
+    return True, "Required Columns Check Passed!"
+
+def _key_sample(keys, sample_size):
+    ids, days = unpack_keys(keys[:sample_size])
+    return [(int(i), str(d)) for i, d in zip(ids, days)]
+
+def key_set_diff(expected_keys, actual_keys, sample_size=5):
+    # expected_keys: sorted unique packed keys; actual_keys: packed keys in file order
+    actual_unique, counts = np.unique(actual_keys, return_counts=True)
+    missing = np.setdiff1d(expected_keys, actual_unique, assume_unique=True)
+    extra = np.setdiff1d(actual_unique, expected_keys, assume_unique=True)
+    duplicates = actual_unique[counts > 1]
+    return {
+        name: {'count': int(keys.size), 'sample': _key_sample(keys, sample_size)}
+        for name, keys in (('missing', missing), ('extra', extra), ('duplicates', duplicates))
+    }
+
+def format_key_set_diff(diff):
+    labels = {'missing': 'missing (id, eom) rows', 'extra': 'unexpected (id, eom) rows', 'duplicates': 'duplicated (id, eom) rows'}
+    parts = []
+    for name, label in labels.items():
+        if diff[name]['count']:
+            sample = ", ".join(f"(id={i}, eom={d})" for i, d in diff[name]['sample'])
+            parts.append(f"{diff[name]['count']} {label}, e.g. {sample}")
+    return "; ".join(parts)
+
+def compare_columns(output_file="data/training_results.csv", chars_file="data/ctff_chars.parquet", context=None):
+    context = context or EvaluationContext(chars_file)
+    try:
+        expected_keys = context.test_keys()
+        output = context.weights(output_file)
+        actual_keys = pack_keys(output['id'].to_numpy(), output['eom'].to_numpy())
+    except (OutputValidationError, KeyError, ValueError, TypeError, AttributeError) as e:
+        return False, f"Columns do not match the required format: {e}"
+
+    diff = key_set_diff(expected_keys, actual_keys)
+    if not any(part['count'] for part in diff.values()):
         return True, "Columns match the required format."
     else:
-        return False, "Columns do not match the required format."
-    
-def calculate_sharpe_ratio():
+        return False, f"Columns do not match the required format: {format_key_set_diff(diff)}"
+
+def monthly_returns(pf, index, extra_columns=None):
+    # Weighted returns, with rets attached to weights through the index instead of a merge
+    w_ret = pf['w'].to_numpy(dtype='float64') * index.lookup(pf['id'].to_numpy(), pf['eom'].to_numpy())
+
+    # Sum of products per eom. The pandas groupby kernel (compensated summation, rows in
+    # weight-file order) is kept so the result is bit-identical to the merge-based score.
+    frame = pd.DataFrame({'w_ret': w_ret, **(extra_columns or {})})
+    return frame.groupby(pf['eom'].to_numpy()).sum()
+
+def sharpe_from_weights(pf, index):
+    rets = monthly_returns(pf, index)['w_ret']
+
+    # Calculate average and volatility
+    average_ret = rets.mean()
+    volatility = rets.std()
+
+    # calculate sharpe
+    return average_ret/volatility
+
+def monthly_turnover(pf, months):
+    # sum_i |w_i,t - w_i,t-1| per month, counting positions opened or closed as a full change
+    eoms = pf['eom'].to_numpy()
+    dated = ~np.isnat(eoms)
+    month_code = np.searchsorted(months, eoms[dated])
+    ids = pf['id'].to_numpy()[dated]
+    w = pf['w'].to_numpy(dtype='float64')[dated]
+    order = np.lexsort((month_code, ids))
+    ids, month_code, w = ids[order], month_code[order], w[order]
+
+    continues = np.zeros(len(w), dtype=bool)
+    continues[1:] = (ids[1:] == ids[:-1]) & (month_code[1:] == month_code[:-1] + 1)
+    prev_w = np.where(continues, np.concatenate(([0.0], w[:-1])), 0.0)
+    turnover = np.bincount(month_code, weights=np.abs(w - prev_w), minlength=len(months))
+
+    # Positions held at t-1 and absent at t are sold down to zero in month t
+    closes = np.ones(len(w), dtype=bool)
+    closes[:-1] = ~continues[1:]
+    closes &= month_code + 1 < len(months)
+    turnover += np.bincount(month_code[closes] + 1, weights=np.abs(w[closes]), minlength=len(months))
+    return turnover
+
+def compute_metrics(pf, index):
+    w = pf['w'].to_numpy(dtype='float64')
+    monthly = monthly_returns(pf, index, {'net_leverage': w, 'gross_leverage': np.abs(w)})
+    rets = monthly['w_ret']
+
+    average_ret = rets.mean()
+    downside = np.sqrt(np.mean(np.minimum(rets.to_numpy(), 0.0) ** 2))
+    wealth = (1 + rets).cumprod()
+    drawdown = wealth / wealth.cummax() - 1
+    # The first month only builds the portfolio, so it is left out of the average turnover
+    turnover = monthly_turnover(pf, monthly.index.to_numpy())[1:]
+
+    return {
+        'sharpe': average_ret / rets.std(),
+        'sortino': average_ret / downside if downside > 0 else np.nan,
+        'max_drawdown': drawdown.min(),
+        'turnover': turnover.mean() if turnover.size else np.nan,
+        'hit_rate': (rets > 0).mean(),
+        'gross_leverage': monthly['gross_leverage'].mean(),
+        'net_leverage': monthly['net_leverage'].mean(),
+    }
+
+def calculate_sharpe_ratio(output_file="data/training_results.csv", context=None):
+    context = context or EvaluationContext()
     try:
         #calculating sharpe:
-        chars = pd.read_parquet("data/ctff_chars.parquet")
-        pf= pd.read_csv("data/training_results.csv")
-        
-        #getting rets attached to weights
-        sharpe_df = pd.merge(
-            pf.assign(
-                id=pf['id'].astype('int64'),
-                eom=pd.to_datetime(pf['eom']),
-                w=pf['w'].astype('float64')
-            )[['id', 'eom', 'w']],
-            chars.assign(
-                id=chars['id'].astype('int64'),
-                eom=pd.to_datetime(chars['eom']),
-                ret_exc_lead1m=chars['ret_exc_lead1m'].astype('float64')
-            )[['id', 'eom', 'ret_exc_lead1m']],
-            on=['id', 'eom'],
-            how='left'
-        )
-
-        # Calculate weighted returns
-        sharpe_df['w_ret'] = sharpe_df['w'] * sharpe_df['ret_exc_lead1m']
-
-        # Group by eom and calculate the sum of products
-        rets = sharpe_df.groupby('eom')['w_ret'].sum()
-
-        # Calculate average and volatility
-        average_ret = rets.mean()
-        volatility = rets.std()
-
-        # calculate sharpe
-        sharpe = average_ret/volatility
+        index = context.return_index()
+        pf = context.weights(output_file)
+        sharpe = sharpe_from_weights(pf, index)
 
         return True, str(sharpe)
 
     except Exception as e:
         return False, str(e)
-    
+
+def calculate_metrics(output_file="data/training_results.csv", context=None):
+    context = context or EvaluationContext()
+    try:
+        return True, compute_metrics(context.weights(output_file), context.return_index())
+    except Exception as e:
+        return False, str(e)
@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+import resource
+import time
+from contextlib import contextmanager
+
+try:
+    from aws_xray_sdk.core import xray_recorder
+except ImportError:
+    xray_recorder = None
+
+TIMINGS_FILE = os.environ.get("TIMINGS_FILE", "timings.json")
+# "emf" prints spans in CloudWatch embedded metric format, "json" as plain records. The awslogs driver
+# only stores either as log events (queryable with Logs Insights); EMF lines become metrics only when
+# shipped by something that marks them as EMF, such as the CloudWatch agent.
+TIMINGS_LOG_FORMAT = os.environ.get("TIMINGS_LOG_FORMAT", "emf")
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "JKPFactors/TrainingJob")
+XRAY_ENABLED = xray_recorder is not None and os.environ.get("AWS_XRAY_SDK_ENABLED", "false").lower() == "true"
+
+_job = {"attributes": {}, "started": time.time()}
+_spans = []
+_open = []
+
+class _Span:
+    """ One timed phase; peak RSS is the high-water mark while the span was open """
+    def __init__(self, name, attributes):
+        self.name = name
+        self.parent = _open[-1].name if _open else None
+        self.attributes = dict(attributes)
+        self.peak_rss_mb = 0.0
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "parent": self.parent,
+            "start_offset_seconds": round(self.started - _job["started"], 3),
+            "wall_seconds": round(self.wall_seconds, 3),
+            "cpu_seconds": round(self.cpu_seconds, 3),
+            "children_cpu_seconds": round(self.children_cpu_seconds, 3),
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+            **self.attributes,
+        }
+
+def _children_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def _high_water_mb():
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _reset_high_water():
+    # Folds the current peak into every open span before resetting it, so outer spans keep the max
+    peak_mb = _high_water_mb()
+    for open_span in _open:
+        open_span.peak_rss_mb = max(open_span.peak_rss_mb, peak_mb)
+    try:
+        # Linux >= 4.0 resets VmHWM to the current RSS
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except OSError:
+        pass
+
+def set_job_attributes(**attributes):
+    _job["attributes"].update(attributes)
+
+def annotate(**attributes):
+    # Adds attributes to the innermost open span, e.g. the peak RSS of a script the supervisor measured
+    if _open:
+        _open[-1].attributes.update(attributes)
+
+def _emit(record):
+    if TIMINGS_LOG_FORMAT == "emf":
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["Phase"]],
+                    "Metrics": [
+                        {"Name": "WallSeconds", "Unit": "Seconds"},
+                        {"Name": "CpuSeconds", "Unit": "Seconds"},
+                        {"Name": "PeakRssMegabytes", "Unit": "Megabytes"},
+                    ],
+                }],
+            },
+            "Phase": record["name"],
+            "WallSeconds": record["wall_seconds"],
+            "CpuSeconds": record["cpu_seconds"] + record["children_cpu_seconds"],
+            "PeakRssMegabytes": record["peak_rss_mb"],
+            **_job["attributes"],
+            **record,
+        }
+    # Printed rather than logged: EMF must be the whole log line, without a logging prefix
+    print(json.dumps(record, default=str), flush=True)
+
+@contextmanager
+def span(name, **attributes):
+    current = _Span(name, attributes)
+    _reset_high_water()
+    _open.append(current)
+    subsegment = xray_recorder.begin_subsegment(name) if XRAY_ENABLED and xray_recorder.current_segment() else None
+
+    current.started = time.time()
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    children_started = _children_cpu_seconds()
+    try:
+        yield current
+    except BaseException as e:
+        current.attributes["error"] = f"{type(e).__name__}: {e}"
+        if subsegment:
+            subsegment.add_exception(e, [])
+        raise
+    finally:
+        current.wall_seconds = time.perf_counter() - wall_started
+        current.cpu_seconds = time.process_time() - cpu_started
+        current.children_cpu_seconds = _children_cpu_seconds() - children_started
+        _reset_high_water()
+        _open.remove(current)
+
+        record = current.to_dict()
+        _spans.append(record)
+        _emit(record)
+        if subsegment:
+            subsegment.put_metadata("timings", record)
+            xray_recorder.end_subsegment()
+
+@contextmanager
+def trace_job(name, **attributes):
+    # Root X-Ray segment for the job; phases inside become subsegments
+    set_job_attributes(**attributes)
+    if XRAY_ENABLED:
+        xray_recorder.configure(service=name, context_missing="LOG_ERROR")
+        segment = xray_recorder.begin_segment(name)
+        for key, value in attributes.items():
+            segment.put_annotation(key, str(value))
+    try:
+        with span(name):
+            yield
+    finally:
+        write_timings()
+        if XRAY_ENABLED:
+            xray_recorder.end_segment()
+
+def write_timings(path=None):
+    path = path or TIMINGS_FILE
+    with open(path, "w") as file:
+        json.dump({"job": _job["attributes"], "spans": _spans}, file, indent=2, default=str)
+    logging.info(f"Wrote {len(_spans)} timing spans to {path}")
+    return path
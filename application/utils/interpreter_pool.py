@@ -0,0 +1,109 @@
+import multiprocessing
+import os
+import random
+import runpy
+import sys
+import tempfile
+import traceback
+import types
+from contextlib import contextmanager
+from multiprocessing import forkserver
+
+from utils import resource_limits
+
+PRELOAD_MODULES = [name.strip() for name in os.environ.get(
+    "PRELOAD_MODULES", "numpy,pandas,pyarrow,sklearn,xgboost,torch,tensorflow"
+).split(",") if name.strip()]
+
+# Stands in for run.py as the main module the forkserver and each child prepare themselves from
+ENTRY_MODULE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pool_entry.py")
+
+_context = None
+
+def get_context():
+    global _context
+    if _context is None:
+        _context = multiprocessing.get_context("forkserver")
+        # Modules that fail to import are skipped by the server, so the list can name optional libraries
+        _context.set_forkserver_preload(PRELOAD_MODULES)
+    return _context
+
+@contextmanager
+def _entry_main():
+    # The server and every child re-import the parent's __main__ (spawn.prepare); swap in the side-effect-free entry module
+    main_module = sys.modules["__main__"]
+    entry = types.ModuleType("__main__")
+    entry.__file__ = ENTRY_MODULE
+    entry.__spec__ = None
+    sys.modules["__main__"] = entry
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main_module
+
+def start():
+    # Start the template process early; it imports the heavy modules while the job stages data
+    get_context()
+    with _entry_main():
+        forkserver.ensure_running()
+
+def _exit_code(code):
+    # Same mapping the interpreter applies to SystemExit
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+def _run_child(script_file, stdout_path, stderr_path, limits):
+    resource_limits.apply_in_child(limits)
+    for fd, path in ((1, stdout_path), (2, stderr_path)):
+        target = os.open(path, os.O_WRONLY | os.O_TRUNC)
+        os.dup2(target, fd)
+        os.close(target)
+
+    # Forked children share the server's random state; draw fresh seeds as a new interpreter would
+    random.seed()
+    numpy = sys.modules.get("numpy")
+    if numpy is not None:
+        numpy.random.seed()
+
+    # Look like `python3 script_file` to the user code
+    sys.argv = [script_file]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script_file)))
+    try:
+        runpy.run_path(script_file, run_name="__main__")
+        code = 0
+    except SystemExit as e:
+        code = _exit_code(e.code)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(code)
+
+def run_forked(script_file, limits=None):
+    # Returns (returncode, stdout, stderr, failure_reason, peak_rss_mb)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stdout_path = os.path.join(tmp_dir, "stdout")
+        stderr_path = os.path.join(tmp_dir, "stderr")
+        open(stdout_path, "w").close()
+        open(stderr_path, "w").close()
+
+        process = get_context().Process(target=_run_child, args=(script_file, stdout_path, stderr_path, limits))
+        with _entry_main():
+            process.start()
+
+        def wait(seconds):
+            process.join(seconds)
+            return process.exitcode
+
+        returncode, reason, peak_rss_mb = resource_limits.supervise(process.pid, limits or resource_limits.ResourceLimits(), wait)
+
+        with open(stdout_path, "r", errors="replace") as file:
+            stdout = file.read()
+        with open(stderr_path, "r", errors="replace") as file:
+            stderr = file.read()
+    return returncode, stdout, stderr, reason, peak_rss_mb
@@ -0,0 +1,19 @@
+import numpy as np
+
+# (id, eom) is packed as id * 2**20 + days since epoch (offset to stay positive)
+KEY_DAY_BITS = 20
+KEY_DAY_OFFSET = 2 ** 19
+KEY_MAX_ABS_ID = 2 ** 42
+
+def pack_keys(ids, eoms):
+    ids = np.asarray(ids, dtype='int64')
+    days = np.asarray(eoms, dtype='datetime64[ns]').astype('datetime64[D]').astype('int64')
+    if ids.size and (ids.min() <= -KEY_MAX_ABS_ID or ids.max() >= KEY_MAX_ABS_ID):
+        raise ValueError("id out of range for packed (id, eom) keys")
+    return ids * (1 << KEY_DAY_BITS) + (days + KEY_DAY_OFFSET)
+
+def unpack_keys(keys):
+    keys = np.asarray(keys, dtype='int64')
+    ids = keys >> KEY_DAY_BITS
+    days = (keys & ((1 << KEY_DAY_BITS) - 1)) - KEY_DAY_OFFSET
+    return ids, days.astype('datetime64[D]')
@@ -0,0 +1,16 @@
+# Wrapper the subprocess runner starts user scripts through: applies the resource limits, then execs
+# python3 on the script so the process keeps its pid and session. This replaces preexec_fn, which is
+# not safe once the job has started threads (artifact uploads, boto3 transfers).
+#
+#     python3 utils/limited_exec.py '<limits json>' script.py
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import resource_limits
+
+if __name__ == "__main__":
+    limits_json, script_file = sys.argv[1:3]
+    resource_limits.apply_limits(resource_limits.from_json(limits_json))
+    os.execvp("python3", ["python3", script_file])
@@ -0,0 +1,175 @@
+import csv
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.keys import pack_keys
+
+REQUIRED_COLUMNS = ["id", "eom", "w"]
+RESULTS_FILE_STEM = "training_results"
+VALIDATION_CHUNK_ROWS = int(os.environ.get("VALIDATION_CHUNK_ROWS", "500000"))
+# Cap on sum(|w|) per month, 10x gross leverage by default; set it empty to disable the check
+MAX_MONTHLY_GROSS_WEIGHT = os.environ.get("MAX_MONTHLY_GROSS_WEIGHT", "10")
+MAX_MONTHLY_GROSS_WEIGHT = float(MAX_MONTHLY_GROSS_WEIGHT) if MAX_MONTHLY_GROSS_WEIGHT else None
+
+
+class OutputValidationError(Exception):
+    pass
+
+
+class _KeySet:
+    # Sorted runs merged like a binary counter: O(log n) runs, each probed with a binary search
+    def __init__(self):
+        self.runs = []
+
+    def contains_any(self, keys):
+        for run in self.runs:
+            if not run.size:
+                continue
+            pos = np.minimum(np.searchsorted(run, keys), run.size - 1)
+            hits = run[pos] == keys
+            if hits.any():
+                return keys[hits]
+        return keys[:0]
+
+    def add(self, keys):
+        run = np.sort(keys)
+        while self.runs and self.runs[-1].size <= run.size:
+            run = np.sort(np.concatenate((self.runs.pop(), run)), kind="mergesort")
+        self.runs.append(run)
+
+
+def detect_format(path):
+    # Sniffed from the magic bytes, so a misnamed upload is still read correctly
+    with open(path, "rb") as file:
+        magic = file.read(6)
+    if magic[:4] == b"PAR1":
+        return "parquet"
+    if magic == b"ARROW1":
+        return "arrow"
+    return "csv"
+
+
+def find_results_file(directory):
+    matches = sorted(glob.glob(os.path.join(directory, f"{RESULTS_FILE_STEM}.*")))
+    if not matches:
+        return os.path.join(directory, f"{RESULTS_FILE_STEM}.csv")
+    return max(matches, key=os.path.getmtime)
+
+
+def read_header(path, file_format=None):
+    file_format = file_format or detect_format(path)
+    if file_format == "parquet":
+        return pq.ParquetFile(path).schema_arrow.names
+    if file_format == "arrow":
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).schema.names
+    with open(path, "r", newline="") as file:
+        return next(csv.reader(file), [])
+
+
+def _iter_chunks(path, file_format, chunk_rows):
+    if file_format == "parquet":
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=REQUIRED_COLUMNS):
+            yield batch.to_pandas()
+    elif file_format == "arrow":
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i).select(REQUIRED_COLUMNS).to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=REQUIRED_COLUMNS, chunksize=chunk_rows)
+
+
+def _read_chunks(path, file_format, chunk_rows):
+    # A truncated or corrupt body only fails once its rows are read, after the header passed
+    chunks = _iter_chunks(path, file_format, chunk_rows)
+    while True:
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        except (pd.errors.ParserError, UnicodeDecodeError, pa.ArrowInvalid, OSError) as e:
+            raise OutputValidationError(f"Output is not a valid {'CSV' if file_format == 'csv' else file_format + ' file'}: {e}")
+        yield chunk
+
+
+def _validate_chunk(chunk, row_offset):
+    def fail(message, mask):
+        first = row_offset + int(np.argmax(mask)) + 2  # 1-based line number after the header
+        raise OutputValidationError(f"{message} ({int(mask.sum())} rows in chunk, first at line {first})")
+
+    ids = pd.to_numeric(chunk["id"], errors="coerce")
+    bad = ids.isna().to_numpy() | (ids.to_numpy(dtype="float64") % 1 != 0)
+    if bad.any():
+        fail("Column 'id' must contain integer values", bad)
+
+    eoms = pd.to_datetime(chunk["eom"], errors="coerce")
+    bad = eoms.isna().to_numpy()
+    if bad.any():
+        fail("Column 'eom' must contain valid dates", bad)
+
+    w = pd.to_numeric(chunk["w"], errors="coerce").to_numpy(dtype="float64")
+    bad = ~np.isfinite(w)
+    if bad.any():
+        fail("Column 'w' must contain finite numbers (no NaN/inf)", bad)
+
+    return pd.DataFrame({"id": ids.astype("int64"), "eom": eoms, "w": w})
+
+
+def iter_validated_chunks(path, chunk_rows=None, max_monthly_gross_weight=None):
+    # Yields normalized (int64 id, datetime64 eom, float64 w) chunks and raises
+    # OutputValidationError on the first chunk that breaks a rule
+    chunk_rows = chunk_rows or VALIDATION_CHUNK_ROWS
+    max_monthly_gross_weight = max_monthly_gross_weight if max_monthly_gross_weight is not None else MAX_MONTHLY_GROSS_WEIGHT
+
+    file_format = detect_format(path)
+    try:
+        header = read_header(path, file_format)
+    except (pa.ArrowInvalid, OSError) as e:
+        raise OutputValidationError(f"Output is not a valid {file_format} file: {e}")
+    if not all(col in header for col in REQUIRED_COLUMNS):
+        raise OutputValidationError("Output does not contain required columns (id, eom, w)")
+
+    seen = _KeySet()
+    gross = pd.Series(dtype="float64")
+    row_offset = 0
+    for chunk in _read_chunks(path, file_format, chunk_rows):
+        chunk = _validate_chunk(chunk, row_offset)
+
+        try:
+            keys = pack_keys(chunk["id"].to_numpy(), chunk["eom"].to_numpy())
+        except ValueError as e:
+            raise OutputValidationError(str(e))
+        unique_keys, counts = np.unique(keys, return_counts=True)
+        duplicated = unique_keys[counts > 1]
+        if not duplicated.size:
+            duplicated = seen.contains_any(unique_keys)
+        if duplicated.size:
+            row = chunk[np.isin(keys, duplicated)].iloc[0]
+            raise OutputValidationError(f"Duplicate (id, eom) rows, e.g. id={row['id']} eom={row['eom'].date()}")
+        seen.add(unique_keys)
+
+        gross = gross.add(chunk["w"].abs().groupby(chunk["eom"]).sum(), fill_value=0.0)
+        if not np.isfinite(gross.to_numpy()).all():
+            raise OutputValidationError("Monthly weight sums overflow")
+        if max_monthly_gross_weight is not None and (gross > max_monthly_gross_weight).any():
+            month = gross[gross > max_monthly_gross_weight].index[0]
+            raise OutputValidationError(f"Sum of |w| for {month.date()} exceeds {max_monthly_gross_weight}")
+
+        row_offset += len(chunk)
+        yield chunk
+
+
+def validate_output_file(path, chunk_rows=None, max_monthly_gross_weight=None):
+    # Constant-memory pass apart from the 8-byte key per row kept for the duplicate check
+    try:
+        for _ in iter_validated_chunks(path, chunk_rows, max_monthly_gross_weight):
+            pass
+    except OutputValidationError as e:
+        return False, str(e)
+    return True, "Required Columns Check Passed!"
@@ -0,0 +1,3 @@
+# Main module of the forkserver and its children. multiprocessing re-executes the parent's main module
+# as __mp_main__ in every child; run.py imports boto3 and configures logging at module level, so the
+# children are pointed at this module instead. Keep it free of imports and side effects.
@@ -1,78 +1,86 @@
 import ast
-import os
+import copy
+from functools import lru_cache
 
-def read_template_function(template_path):
+# Nodes whose lists can hold statements; match_case only exists on Python >= 3.10
+STATEMENT_NODES = (ast.stmt, ast.excepthandler) + ((ast.match_case,) if hasattr(ast, "match_case") else ())
+
+@lru_cache(maxsize=None)
+def parse_template(template_path):
+    # Parsed once per process; the node is copied before it is placed in a script tree
     with open(template_path, 'r') as file:
-        return file.read()
+        return ast.parse(file.read()).body[0]
 
-def replace_function_in_ast(tree, function_name, new_function_code):
-    new_function_node = ast.parse(new_function_code).body[0]
-    
-    class FunctionTransformer(ast.NodeTransformer):
-        def visit_FunctionDef(self, node):
-            if node.name == function_name:
-                return new_function_node
-            return node
-    
-    transformer = FunctionTransformer()
-    tree = transformer.visit(tree)
-    return tree
+def is_main_block(node):
+    return (isinstance(node.test, ast.Compare) and
+            isinstance(node.test.left, ast.Name) and
+            node.test.left.id == "__name__" and
+            isinstance(node.test.ops[0], ast.Eq) and
+            isinstance(node.test.comparators[0], ast.Constant) and
+            node.test.comparators[0].value == "__main__")
 
-def add_function_before_main(tree, function_name, new_function_code):
-    new_function_node = ast.parse(new_function_code).body[0]
-    new_body = []
-    added = False
+class TemplateTransformer(ast.NodeTransformer):
+    """ Swaps template functions and the __main__ block in one pass, leaving the input tree untouched """
+    def __init__(self, functions, main_block=None):
+        self.functions = functions
+        self.main_block = main_block
+        # Same scope as the separate passes this replaces: template functions are not looked for inside
+        # other functions, and the __main__ block is not looked for inside another if statement
+        self.function_depth = 0
+        self.if_depth = 0
 
-    for node in tree.body:
-        if isinstance(node, ast.FunctionDef) and node.name == "main":
-            if not added:
-                new_body.append(new_function_node)
-                added = True
-        new_body.append(node)
+    def visit_FunctionDef(self, node):
+        if self.function_depth == 0 and node.name in self.functions:
+            return copy.deepcopy(self.functions[node.name])
+        self.function_depth += 1
+        try:
+            return self.generic_visit(node)
+        finally:
+            self.function_depth -= 1
 
-    if not added:
-        new_body.append(new_function_node)
-    
-    tree.body = new_body
-    return tree
+    def visit_If(self, node):
+        if self.main_block is not None and self.if_depth == 0 and is_main_block(node):
+            return copy.deepcopy(self.main_block)
+        self.if_depth += 1
+        try:
+            return self.generic_visit(node)
+        finally:
+            self.if_depth -= 1
 
-def replace_main_block(script_path, main_block_template_path):
-    with open(script_path, 'r') as file:
-        tree = ast.parse(file.read())
-    
-    main_block_code = read_template_function(main_block_template_path)
-    main_block_node = ast.parse(main_block_code).body[0]
-    
-    class MainBlockTransformer(ast.NodeTransformer):
-        def visit_If(self, node):
-            if (isinstance(node.test, ast.Compare) and
-                isinstance(node.test.left, ast.Name) and
-                node.test.left.id == "__name__" and
-                isinstance(node.test.ops[0], ast.Eq) and
-                isinstance(node.test.comparators[0], ast.Constant) and
-                node.test.comparators[0].value == "__main__"):
-                return main_block_node
+    def generic_visit(self, node):
+        # Copy-on-write over statement lists only (functions and the main block are statements);
+        # unchanged subtrees stay shared with the parsed script so it can feed the next variant
+        changed = {}
+        for field, value in ast.iter_fields(node):
+            if not isinstance(value, list) or not any(isinstance(item, STATEMENT_NODES) for item in value):
+                continue
+            new_value = [self.visit(item) for item in value]
+            if any(new is not old for new, old in zip(new_value, value)):
+                changed[field] = new_value
+        if not changed:
             return node
-    
-    transformer = MainBlockTransformer()
-    tree = transformer.visit(tree)
-    
-    with open(script_path, 'w') as file:
-        file.write(ast.unparse(tree))
+        node = copy.copy(node)
+        for field, new_value in changed.items():
+            setattr(node, field, new_value)
+        return node
+
+def apply_templates(tree, template_functions_mapping, main_block_template_path=None):
+    functions = {name: parse_template(path) for name, path in template_functions_mapping.items()}
+    main_block = parse_template(main_block_template_path) if main_block_template_path else None
+    new_tree = TemplateTransformer(functions, main_block).visit(tree)
 
-def update_script_with_template_functions(script_path, template_functions_mapping):
-    with open(script_path, 'r') as file:
-        tree = ast.parse(file.read())
-    
+    # Template functions the script does not define go before its main(), or at the end
     existing_functions = {node.name for node in ast.walk(tree) if isinstance(node, ast.FunctionDef)}
-    
-    for function_name, template_path in template_functions_mapping.items():
-        new_function_code = read_template_function(template_path)
-        if function_name in existing_functions:
-            tree = replace_function_in_ast(tree, function_name, new_function_code)
-        else:
-            tree = add_function_before_main(tree, function_name, new_function_code)
-    
-    with open(script_path, 'w') as file:
-        file.write(ast.unparse(tree))
+    missing = [copy.deepcopy(functions[name]) for name in template_functions_mapping if name not in existing_functions]
+    if missing:
+        new_tree = copy.copy(new_tree)
+        body = list(new_tree.body)
+        position = next((i for i, node in enumerate(body) if isinstance(node, ast.FunctionDef) and node.name == "main"), len(body))
+        body[position:position] = missing
+        new_tree.body = body
+    return new_tree
 
+def render_script(tree, template_functions_mapping, main_block_template_path, output_path):
+    # One transform and one unparse per variant, from the tree parsed once by the static checks
+    with open(output_path, 'w') as file:
+        file.write(ast.unparse(apply_templates(tree, template_functions_mapping, main_block_template_path)))
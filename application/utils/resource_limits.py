@@ -0,0 +1,192 @@
+import json
+import math
+import os
+import resource
+import signal
+import time
+
+SUPERVISOR_POLL_SECONDS = float(os.environ.get("SUPERVISOR_POLL_SECONDS", "1"))
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+# Defaults per phase; each can be overridden with SCRIPT_<PHASE>_<LIMIT>, e.g. SCRIPT_INTEGRITY_CHECK_TIMEOUT_SECONDS
+PHASE_DEFAULTS = {
+    "integrity_check": {"TIMEOUT_SECONDS": "1800"},
+    "complete_training": {"TIMEOUT_SECONDS": "32400"},
+}
+
+def _env_limit(phase, name, default=""):
+    value = os.environ.get(f"SCRIPT_{phase.upper()}_{name}") or os.environ.get(f"SCRIPT_{name}") or PHASE_DEFAULTS.get(phase, {}).get(name, default)
+    return float(value) if value else None
+
+def _job_cpu_count():
+    # vCPUs granted to the container: cgroup v2 cpu.max, then v1 cfs quota, else every allowed CPU
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as file:
+            quota, period = file.read().split()
+        if quota != "max":
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as file:
+            quota = int(file.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as file:
+            period = int(file.read())
+        if quota > 0:
+            return max(1, math.ceil(quota / period))
+    except (OSError, ValueError):
+        pass
+    return None
+
+def _parse_cpu_list(text):
+    # Kernel cpu list format, e.g. "0-3,8,10-11"
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+def _container_cpuset():
+    # CPUs reserved for this container by its own cgroup cpuset; None when it may use every host CPU
+    for path in ("/sys/fs/cgroup/cpuset.cpus.effective", "/sys/fs/cgroup/cpuset/cpuset.effective_cpus", "/sys/fs/cgroup/cpuset/cpuset.cpus"):
+        try:
+            with open(path) as file:
+                cpus = _parse_cpu_list(file.read())
+        except (OSError, ValueError):
+            continue
+        if cpus and len(cpus) < (os.cpu_count() or 0):
+            return cpus
+        return None
+    return None
+
+class ResourceLimits:
+    def __init__(self, timeout_seconds=None, max_rss_mb=None, max_address_space_mb=None, cpus=None):
+        self.timeout_seconds = timeout_seconds
+        self.max_rss_mb = max_rss_mb
+        self.max_address_space_mb = max_address_space_mb
+        self.cpus = cpus
+
+    @classmethod
+    def for_phase(cls, phase):
+        return cls(
+            timeout_seconds=_env_limit(phase, "TIMEOUT_SECONDS"),
+            max_rss_mb=_env_limit(phase, "MAX_RSS_MB"),
+            # Off by default: CUDA reserves far more address space than it uses
+            max_address_space_mb=_env_limit(phase, "MAX_ADDRESS_SPACE_MB"),
+            cpus=_pinned_cpus(phase),
+        )
+
+def _pinned_cpus(phase):
+    # Cores named in SCRIPT_CPUS (or SCRIPT_<PHASE>_CPUS), e.g. "0-3", restricted to the CPUs this job may use.
+    # Without it scripts are pinned only inside a container cpuset smaller than the host; ECS and Batch jobs
+    # normally get just a CPU quota, so there the script is not pinned and the scheduler places it.
+    if os.environ.get("SCRIPT_CPU_PINNING", "True") != "True":
+        return None
+    configured = os.environ.get(f"SCRIPT_{phase.upper()}_CPUS") or os.environ.get("SCRIPT_CPUS")
+    if configured:
+        allowed = os.sched_getaffinity(0)
+        cpus = [cpu for cpu in _parse_cpu_list(configured) if cpu in allowed]
+        return cpus or None
+    cpuset = _container_cpuset()
+    if cpuset:
+        count = int(_env_limit(phase, "CPU_COUNT") or _job_cpu_count() or len(cpuset))
+        return cpuset[:count]
+    return None
+
+def to_json(limits):
+    return json.dumps(vars(limits) if limits else None)
+
+def from_json(text):
+    values = json.loads(text)
+    return ResourceLimits(**values) if values else None
+
+def apply_limits(limits):
+    # Runs in the script process before any user code
+    if limits is None:
+        return
+    if limits.max_address_space_mb:
+        size = int(limits.max_address_space_mb * 1024 ** 2)
+        resource.setrlimit(resource.RLIMIT_AS, (size, size))
+    if limits.cpus:
+        os.sched_setaffinity(0, limits.cpus)
+
+def apply_in_child(limits):
+    # Forked children start their own session here so the supervisor can kill the whole tree
+    os.setsid()
+    apply_limits(limits)
+
+def _process_tree(pid):
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as file:
+                # ppid is the 2nd field after the parenthesised command name
+                ppid = int(file.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+def tree_rss_mb(pid):
+    total = 0
+    for member in _process_tree(pid):
+        try:
+            with open(f"/proc/{member}/statm") as file:
+                total += int(file.read().split()[1]) * PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            continue
+    return total / 1024 ** 2
+
+def _kill_tree(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+def supervise(pid, limits, wait):
+    # wait(seconds) returns the exit code, or None if the script is still running.
+    # Returns (returncode, failure_reason or None, peak_rss_mb).
+    started = time.monotonic()
+    peak_rss_mb = 0.0
+    while True:
+        returncode = wait(SUPERVISOR_POLL_SECONDS)
+        if returncode is not None:
+            return returncode, None, peak_rss_mb
+
+        reason = None
+        elapsed = time.monotonic() - started
+        rss_mb = tree_rss_mb(pid)
+        peak_rss_mb = max(peak_rss_mb, rss_mb)
+        if limits.timeout_seconds and elapsed > limits.timeout_seconds:
+            reason = f"Script exceeded its time budget of {limits.timeout_seconds:.0f} seconds and was stopped"
+        elif limits.max_rss_mb and rss_mb > limits.max_rss_mb:
+            reason = f"Script exceeded the memory limit of {limits.max_rss_mb:.0f} MB (RSS {rss_mb:.0f} MB) and was stopped"
+        if reason:
+            _kill_tree(pid)
+            returncode = None
+            while returncode is None:
+                returncode = wait(SUPERVISOR_POLL_SECONDS)
+            return returncode, reason, peak_rss_mb
+
+def describe_exit(returncode, stderr, limits):
+    # Failure reason for an exit the supervisor did not cause itself
+    if returncode < 0:
+        try:
+            name = signal.Signals(-returncode).name
+        except ValueError:
+            # Real-time and other signals without a name in the signal module
+            name = str(-returncode)
+        hint = " (likely killed by the out-of-memory killer)" if -returncode == signal.SIGKILL else ""
+        return f"Script was terminated by signal {name}{hint}"
+    if limits and limits.max_address_space_mb and "MemoryError" in stderr:
+        return f"Script ran out of memory under the address-space limit of {limits.max_address_space_mb:.0f} MB"
+    return None
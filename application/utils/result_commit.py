@@ -0,0 +1,187 @@
+import hashlib
+import logging
+import math
+import os
+from datetime import datetime
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from utils.aws_clients import get_client
+from utils.s3_transfer import with_retries
+
+SUBMISSIONS_TABLE = os.environ.get("SUBMISSIONS_TABLE", "submissions")
+BENCHMARKS_TABLE = os.environ.get("BENCHMARKS_TABLE", "benchmarks")
+# DynamoDB caps one transaction at 100 actions
+TRANSACT_MAX_ITEMS = int(os.environ.get("TRANSACT_MAX_ITEMS", "100"))
+# Reserved benchmarks item whose counter the CRUD Lambda compares to know its cached reads are stale
+BENCHMARKS_VERSION_KEY = {'email': {'S': '#benchmarks-version'}, 'submission_timestamp': {'S': '0'}}
+
+
+def metrics_attribute(metrics):
+    # Stored as strings, like sharpe, since DynamoDB numbers cannot hold NaN/inf
+    return {'M': {name: {'S': str(value)} for name, value in metrics.items()}}
+
+
+def leaderboard_partition(dataset_s3_uri):
+    # Submissions are ranked per dataset year: s3://.../complete/2024/ -> "2024"
+    return dataset_s3_uri.rstrip('/').split('/')[-1]
+
+
+def _key(email, submission_timestamp):
+    return {'email': {'S': email}, 'submission_timestamp': {'S': submission_timestamp}}
+
+
+def submission_update(email, submission_timestamp, weights_key, retrain, sharpe_ratio):
+    # Appends this run to the submission's retrain_list
+    retrain_record = {
+        'weights': {'S': weights_key},
+        'retrain': {'BOOL': retrain},
+        'train_time': {'S': datetime.now().isoformat()},
+        'sharpe_ratio': {'S': sharpe_ratio},
+    }
+    return {'Update': {
+        'TableName': SUBMISSIONS_TABLE,
+        'Key': _key(email, submission_timestamp),
+        'UpdateExpression': "SET retrain_list = list_append(if_not_exists(retrain_list, :empty_list), :retrain_record)",
+        'ExpressionAttributeValues': {
+            ':retrain_record': {'L': [{'M': retrain_record}]},
+            ':empty_list': {'L': []},
+        },
+    }}
+
+
+def benchmark_update(email, submission_timestamp, sharpe_ratio, metrics=None, user_name=None, model_name=None, leaderboard=None):
+    assignments = {'sharpe': {'S': sharpe_ratio}}
+    removals = []
+    if user_name is not None:
+        assignments['user_name'] = {'S': user_name}
+    if model_name is not None:
+        assignments['model_name'] = {'S': model_name}
+    if metrics:
+        assignments['metrics'] = metrics_attribute(metrics)
+    if leaderboard is not None:
+        # leaderboard/sharpe_value key the sparse leaderboard index; a NaN/inf Sharpe takes the item off it
+        try:
+            sharpe_value = float(sharpe_ratio)
+        except ValueError:
+            sharpe_value = math.nan
+        if math.isfinite(sharpe_value):
+            assignments['leaderboard'] = {'S': leaderboard}
+            assignments['sharpe_value'] = {'N': repr(sharpe_value)}
+        else:
+            removals = ['leaderboard', 'sharpe_value']
+
+    # Names go through placeholders: metrics is a DynamoDB reserved word
+    update_expression = "SET " + ", ".join(f"#{name} = :{name}" for name in assignments)
+    if removals:
+        update_expression += " REMOVE " + ", ".join(f"#{name}" for name in removals)
+    return {'Update': {
+        'TableName': BENCHMARKS_TABLE,
+        'Key': _key(email, submission_timestamp),
+        'UpdateExpression': update_expression,
+        'ExpressionAttributeNames': {f"#{name}": name for name in [*assignments, *removals]},
+        'ExpressionAttributeValues': {f":{name}": value for name, value in assignments.items()},
+    }}
+
+
+def bump_benchmarks_version():
+    # Kept out of the transactions: every commit writing this one item would make concurrent commits
+    # conflict with each other. Best effort, a missed bump only delays the Lambda cache until its TTL.
+    try:
+        get_client('dynamodb').update_item(
+            TableName=BENCHMARKS_TABLE,
+            Key=BENCHMARKS_VERSION_KEY,
+            UpdateExpression="ADD #version :one",
+            ExpressionAttributeNames={'#version': 'version'},
+            ExpressionAttributeValues={':one': {'N': '1'}},
+        )
+    except (BotoCoreError, ClientError) as e:
+        logging.warning(f"Benchmarks version bump failed: {e}")
+
+
+class IdempotentParameterMismatch(Exception):
+    """ The request token was already used by a transaction with different actions """
+
+
+def job_request_token():
+    # One token per Batch job attempt: its retried calls are deduplicated, a resubmitted job commits again.
+    # None outside Batch, where there is no job identity to tie the write to.
+    job_id = os.environ.get("AWS_BATCH_JOB_ID")
+    if not job_id:
+        return None
+    attempt = os.environ.get("AWS_BATCH_JOB_ATTEMPT", "1")
+    # ClientRequestToken is at most 36 characters, the length of the job ID alone
+    return hashlib.sha256(f"{job_id}\0{attempt}".encode()).hexdigest()[:36]
+
+
+def transact(actions, client_request_token=None):
+    params = {'TransactItems': actions}
+    if client_request_token:
+        params['ClientRequestToken'] = client_request_token
+
+    def call():
+        try:
+            get_client('dynamodb').transact_write_items(**params)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'IdempotentParameterMismatchException':
+                raise
+            # Retrying cannot succeed, the token stays bound to the other transaction for 10 minutes
+            return e
+        return None
+
+    mismatch = with_retries(call, f"TransactWriteItems ({len(actions)} actions)")
+    if mismatch is not None:
+        raise IdempotentParameterMismatch(f"Request token {client_request_token} was already used for a different transaction") from mismatch
+
+
+def commit_result(email, submission_timestamp, weights_key, retrain, sharpe_ratio, user_name, model_name, metrics=None, leaderboard=None):
+    # The retrain record and the benchmark are written together or not at all. The token makes a
+    # retried call within DynamoDB's 10-minute idempotency window a no-op instead of a second append.
+    token = job_request_token()
+    transact([
+        submission_update(email, submission_timestamp, weights_key, retrain, sharpe_ratio),
+        benchmark_update(email, submission_timestamp, sharpe_ratio, metrics, user_name, model_name, leaderboard),
+    ], token)
+    bump_benchmarks_version()
+
+
+class BatchCommitter:
+    """ Buffers result commits into transactions of up to TRANSACT_MAX_ITEMS actions """
+    def __init__(self, max_items=None):
+        self.max_items = max_items or TRANSACT_MAX_ITEMS
+        self.pending = []
+        self.keys = set()
+        self.committed = 0
+
+    def add(self, actions):
+        # One commit never spans two transactions, and a transaction may touch each item only once
+        keys = {(action['Update']['TableName'], action['Update']['Key']['email']['S'], action['Update']['Key']['submission_timestamp']['S']) for action in actions}
+        if len(self.pending) + len(actions) > self.max_items or keys & self.keys:
+            self.flush()
+        self.pending.extend(actions)
+        self.keys |= keys
+
+    def flush(self):
+        if not self.pending:
+            return
+        transact(self.pending)
+        bump_benchmarks_version()
+        self.committed += len(self.pending)
+        self.pending = []
+        self.keys = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+
+def commit_rescored(results, leaderboard=None):
+    # results: dicts with email, submission_timestamp, sharpe_ratio and metrics from a bulk re-scoring run
+    with BatchCommitter() as committer:
+        for result in results:
+            committer.add([benchmark_update(result['email'], result['submission_timestamp'], result['sharpe_ratio'], result['metrics'], leaderboard=leaderboard)])
+    logging.info(f"Committed {committer.committed} benchmark updates")
+    return committer.committed
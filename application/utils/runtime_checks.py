@@ -1,18 +1,67 @@
+import logging
+import os
 import subprocess
+import tempfile
 
-def run_script(script_file):
-    try:
-        result = subprocess.run(
-            ["python3", script_file],
-            check=True,
-            capture_output=True,
-            text=True
+from utils import instrumentation, interpreter_pool, resource_limits
+
+# "subprocess" starts a fresh python3 per script, "forkserver" forks it from a pre-warmed template process
+SCRIPT_RUNNER = os.environ.get("SCRIPT_RUNNER", "subprocess")
+# stdout/stderr of every run are kept here and published with the job artifacts
+SCRIPT_LOG_DIR = os.environ.get("SCRIPT_LOG_DIR", "logs")
+# Lines of stderr appended to a failure reason, so tracebacks and limit errors reach the user's email
+STDERR_TAIL_LINES = int(os.environ.get("STDERR_TAIL_LINES", "20"))
+
+LIMITED_EXEC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "limited_exec.py")
+
+def prepare_runner():
+    if SCRIPT_RUNNER == "forkserver":
+        interpreter_pool.start()
+
+def _run_subprocess(script_file, limits):
+    # Output goes to files rather than pipes so the supervisor can poll without draining them
+    with tempfile.TemporaryFile("w+") as stdout, tempfile.TemporaryFile("w+") as stderr:
+        # The new session lets the supervisor kill the whole tree; the wrapper applies the limits and execs the script
+        process = subprocess.Popen(
+            ["python3", LIMITED_EXEC, resource_limits.to_json(limits), script_file],
+            stdout=stdout,
+            stderr=stderr,
+            text=True,
+            start_new_session=True
         )
-        print(result.stdout)
-        
-        if result.returncode!=0:
-            return False, "Runtime checks failed"   
-        else:
-            return True, "Runtime checks passed"
-    except subprocess.CalledProcessError as e:
-        return False, f"Runtime Error: {e.output}"
+
+        def wait(seconds):
+            try:
+                return process.wait(seconds)
+            except subprocess.TimeoutExpired:
+                return None
+
+        returncode, reason, peak_rss_mb = resource_limits.supervise(process.pid, limits, wait)
+        stdout.seek(0)
+        stderr.seek(0)
+        return returncode, stdout.read(), stderr.read(), reason, peak_rss_mb
+
+def _stderr_tail(stderr):
+    lines = stderr.rstrip().splitlines()[-STDERR_TAIL_LINES:]
+    return "\n".join(lines)
+
+def run_script(script_file, phase="complete_training"):
+    limits = resource_limits.ResourceLimits.for_phase(phase)
+    if SCRIPT_RUNNER == "forkserver":
+        returncode, stdout, stderr, reason, peak_rss_mb = interpreter_pool.run_forked(script_file, limits)
+    else:
+        returncode, stdout, stderr, reason, peak_rss_mb = _run_subprocess(script_file, limits)
+    print(stdout)
+    os.makedirs(SCRIPT_LOG_DIR, exist_ok=True)
+    for stream, text in (("stdout", stdout), ("stderr", stderr)):
+        with open(os.path.join(SCRIPT_LOG_DIR, f"{phase}.{stream}.log"), "w") as file:
+            file.write(text)
+    logging.info(f"{phase} script exited with {returncode}, peak RSS {peak_rss_mb:.0f} MB")
+    instrumentation.annotate(script_returncode=returncode, script_peak_rss_mb=round(peak_rss_mb, 1))
+
+    reason = reason or (resource_limits.describe_exit(returncode, stderr, limits) if returncode != 0 else None)
+    if reason or returncode != 0:
+        details = "\n".join(part for part in (reason, _stderr_tail(stderr), stdout) if part)
+        return False, f"Runtime Error: {details}"
+    else:
+        return True, "Runtime checks passed"
@@ -0,0 +1,113 @@
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+S3_DOWNLOAD_CONCURRENCY = int(os.environ.get("S3_DOWNLOAD_CONCURRENCY", "16"))
+S3_PART_SIZE = int(os.environ.get("S3_PART_SIZE_MB", "64")) * 1024 ** 2
+S3_MAX_ATTEMPTS = int(os.environ.get("S3_MAX_ATTEMPTS", "5"))
+S3_BACKOFF_BASE_SECONDS = float(os.environ.get("S3_BACKOFF_BASE_SECONDS", "0.5"))
+
+READ_CHUNK_SIZE = 1024 ** 2
+
+
+def with_retries(func, description, max_attempts=None):
+    max_attempts = max_attempts or S3_MAX_ATTEMPTS
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return func()
+        except Exception as e:
+            if attempt == max_attempts:
+                raise
+            delay = S3_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1) * (1 + random.random())
+            logging.warning(f"{description} failed (attempt {attempt}/{max_attempts}): {e}. Retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _fetch_range(s3, bucket, key, etag, fd, start, end):
+    def fetch():
+        params = {"Bucket": bucket, "Key": key, "Range": f"bytes={start}-{end}"}
+        if etag:
+            # Parts of one file must all come from the same object version
+            params["IfMatch"] = etag
+        response = s3.get_object(**params)
+        offset = start
+        for chunk in response["Body"].iter_chunks(READ_CHUNK_SIZE):
+            os.pwrite(fd, chunk, offset)
+            offset += len(chunk)
+        if offset != end + 1:
+            raise IOError(f"Short read for bytes {start}-{end}: got {offset - start} bytes")
+    with_retries(fetch, f"GET s3://{bucket}/{key} bytes={start}-{end}")
+
+
+def _part_ranges(size, part_size):
+    return [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+
+class DownloadJob:
+    def __init__(self, bucket, key, size, local_path, etag=None):
+        self.bucket = bucket
+        self.key = key
+        self.size = size
+        self.etag = etag
+        self.local_path = local_path
+        self.started = None
+        self.finished = None
+        self.pending_parts = 0
+
+    def report(self):
+        seconds = max(self.finished - self.started, 1e-6)
+        return {
+            "key": f"s3://{self.bucket}/{self.key}",
+            "bytes": self.size,
+            "seconds": round(seconds, 3),
+            "mb_per_second": round(self.size / seconds / 1024 ** 2, 2),
+        }
+
+
+def download_many(s3, jobs, concurrency=None, part_size=None):
+    # jobs: list of DownloadJob. Every part of every object is scheduled on one bounded pool,
+    # so many small files and the parts of a few large ones are fetched side by side.
+    concurrency = concurrency or S3_DOWNLOAD_CONCURRENCY
+    part_size = part_size or S3_PART_SIZE
+    reports = []
+    fds = {}
+    lock = threading.Lock()
+
+    def part_done(job):
+        with lock:
+            job.pending_parts -= 1
+            if job.pending_parts == 0:
+                job.finished = time.time()
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        futures = []
+        for job in jobs:
+            os.makedirs(os.path.dirname(job.local_path) or ".", exist_ok=True)
+            fds[id(job)] = fd = os.open(job.local_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            job.started = time.time()
+            if job.size == 0:
+                job.finished = job.started
+                continue
+            ranges = _part_ranges(job.size, part_size)
+            job.pending_parts = len(ranges)
+            for start, end in ranges:
+                future = executor.submit(_fetch_range, s3, job.bucket, job.key, job.etag, fd, start, end)
+                future.add_done_callback(lambda _, job=job: part_done(job))
+                futures.append(future)
+        for future in futures:
+            future.result()
+    finally:
+        # On failure, stop scheduling the remaining parts instead of draining the queue
+        executor.shutdown(wait=True, cancel_futures=True)
+        for fd in fds.values():
+            os.close(fd)
+
+    for job in jobs:
+        report = job.report()
+        logging.info(f"Downloaded {report['key']}: {report['bytes']} bytes in {report['seconds']}s ({report['mb_per_second']} MB/s)")
+        reports.append(report)
+    return reports
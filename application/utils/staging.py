@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils import data_cache
+from utils.boto3_helper import download_from_s3
+
+STAGING_RECORD_PATH = os.environ.get("STAGING_RECORD_PATH", "staging.json")
+# Uncompressed Arrow IPC copies of staged parquet files that load_data memory-maps
+ARROW_CACHE_ENABLED = os.environ.get("ARROW_CACHE_ENABLED", "True") == "True"
+ARROW_CACHE_BUCKET = "arrow-ipc"
+# Folded into the ETag the conversion is cached under: blobs are named by (etag, size), so the Arrow
+# copy would otherwise share the blob of its source parquet file. Bump when the conversion changes.
+ARROW_CACHE_DERIVATION = "arrow-ipc:v2"
+
+_staged = {}
+
+
+def _normalize_uri(s3_uri):
+    # A dataset is always a prefix, with or without the trailing slash in the job config
+    return s3_uri if s3_uri.endswith("/") else s3_uri + "/"
+
+
+def plan_staging(phases, phase_datasets, datasets):
+    # phase_datasets: phase -> dataset names it reads, datasets: name -> (s3_uri, local_path).
+    # Returns [(s3_uri, [local_path, ...])] with every prefix listed exactly once.
+    plan = {}
+    for phase in phases:
+        for name in phase_datasets[phase]:
+            s3_uri, local_path = datasets[name]
+            local_paths = plan.setdefault(_normalize_uri(s3_uri), [])
+            if local_path not in local_paths:
+                local_paths.append(local_path)
+    return list(plan.items())
+
+
+def arrow_path(parquet_path):
+    return os.path.splitext(parquet_path)[0] + ".arrow"
+
+
+def arrow_cache_etag(etag):
+    return f"{ARROW_CACHE_DERIVATION}:{etag}"
+
+
+def _write_arrow(parquet_path, target_path):
+    # One record batch per file, so every column is a single contiguous buffer that
+    # to_pandas(split_blocks=True) can wrap without concatenating chunks. This holds the
+    # table in memory during the conversion, once per staged file.
+    table = pq.read_table(parquet_path).combine_chunks()
+    with pa.OSFile(target_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=max(table.num_rows, 1))
+
+
+def convert_to_arrow(s3_uri, source, objects):
+    # Converted once per parquet ETag; with the data cache enabled the result is kept across jobs
+    bucket, prefix = s3_uri.replace("s3://", "").split("/", 1)
+    parquet_objects = [(key, etag, size) for key, etag, size in objects if key.endswith(".parquet")]
+    converted = []
+    if not parquet_objects:
+        return converted
+
+    if not data_cache.cache_enabled():
+        for key, _, _ in parquet_objects:
+            parquet_path = os.path.join(source, os.path.relpath(key, prefix))
+            _write_arrow(parquet_path, arrow_path(parquet_path))
+            converted.append(key)
+        return converted
+
+    misses = []
+    for key, etag, size in parquet_objects:
+        parquet_path = os.path.join(source, os.path.relpath(key, prefix))
+        cached_path = data_cache.lookup(ARROW_CACHE_BUCKET, f"{bucket}/{key}", arrow_cache_etag(etag), size)
+        if cached_path:
+            data_cache.materialize(cached_path, arrow_path(parquet_path))
+        else:
+            misses.append((key, etag, size, parquet_path))
+        converted.append(key)
+
+    def convert_many(pending):
+        for (_, cache_key, _, _), tmp_path in pending:
+            key = cache_key.split("/", 1)[1]
+            _write_arrow(os.path.join(source, os.path.relpath(key, prefix)), tmp_path)
+
+    if misses:
+        logging.info(f"Converting {len(misses)} parquet files under {s3_uri} to Arrow IPC")
+        cached_paths = data_cache.insert_many([(ARROW_CACHE_BUCKET, f"{bucket}/{key}", arrow_cache_etag(etag), size) for key, etag, size, _ in misses], convert_many)
+        for (_, _, _, parquet_path), cached_path in zip(misses, cached_paths):
+            data_cache.materialize(cached_path, arrow_path(parquet_path))
+    return converted
+
+
+def _write_record():
+    with open(STAGING_RECORD_PATH, "w") as file:
+        json.dump(_staged, file, indent=2)
+
+
+def stage_datasets(plan):
+    for s3_uri, local_paths in plan:
+        record = _staged.setdefault(s3_uri, {"local_paths": [], "objects": []})
+        pending = [path for path in local_paths if path not in record["local_paths"]]
+        if not pending:
+            logging.info(f"{s3_uri} already staged, skipping")
+            continue
+
+        if record["local_paths"]:
+            source = record["local_paths"][0]
+        else:
+            source = pending.pop(0)
+            record["objects"] = download_from_s3(s3_uri, source)
+            record["arrow"] = convert_to_arrow(s3_uri, source, record["objects"]) if ARROW_CACHE_ENABLED else []
+            record["local_paths"].append(source)
+
+        # The same prefix requested under another directory is linked from the first copy
+        prefix = s3_uri.replace("s3://", "").split("/", 1)[1]
+        relative_paths = [os.path.relpath(key, prefix) for key, _, _ in record["objects"]]
+        relative_paths += [arrow_path(os.path.relpath(key, prefix)) for key in record.get("arrow", [])]
+        for local_path in pending:
+            for relative_path in relative_paths:
+                data_cache.materialize(os.path.join(source, relative_path), os.path.join(local_path, relative_path))
+            record["local_paths"].append(local_path)
+        _write_record()
+    return _staged
+
+
+def staged_objects(s3_uri):
+    return _staged.get(_normalize_uri(s3_uri), {}).get("objects", [])
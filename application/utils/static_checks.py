@@ -57,12 +57,14 @@ def check_main_return_type(tree):
                         return False, "The 'main' function should return a pf"
     return True, ""
 
-def perform_static_checks(file_path):
-    syntax_ok, result = check_syntax(file_path)
-    if not syntax_ok:
-        return False, f"Syntax Error: {result}"
+def perform_static_checks(file_path, tree=None):
+    # Callers that already parsed the script pass the tree to skip a second parse
+    if tree is None:
+        syntax_ok, result = check_syntax(file_path)
+        if not syntax_ok:
+            return False, f"Syntax Error: {result}"
+        tree = result
     
-    tree = result
     missing_functions = check_required_functions(tree)
     if missing_functions:
         return False, f"Missing required functions: {', '.join(missing_functions)}"
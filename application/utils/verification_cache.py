@@ -0,0 +1,120 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from utils.aws_clients import get_client
+from utils.data_cache import DATA_CACHE_DIR
+
+# "local" keeps results under the host data cache, "dynamodb" shares them across instances, "none" disables
+VERIFICATION_CACHE_BACKEND = os.environ.get("VERIFICATION_CACHE_BACKEND", "local")
+VERIFICATION_CACHE_DIR = os.environ.get("VERIFICATION_CACHE_DIR", os.path.join(DATA_CACHE_DIR, "verification") if DATA_CACHE_DIR else "")
+VERIFICATION_CACHE_TABLE = os.environ.get("VERIFICATION_CACHE_TABLE", "verification-cache")
+VERIFICATION_CACHE_TTL_DAYS = int(os.environ.get("VERIFICATION_CACHE_TTL_DAYS", "90"))
+# Bump when the integrity checks themselves change, so earlier passes are not reused
+CHECKS_VERSION = "1"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def dataset_manifest_sha256(objects):
+    # objects: (key, etag, size) of every staged object; the ETags pin the dataset version
+    digest = hashlib.sha256()
+    for key, etag, size in sorted(objects):
+        digest.update(f"{key}\0{etag}\0{size}\n".encode())
+    return digest.hexdigest()
+
+
+def verification_key(script_file, template_paths, dataset_objects, output_file):
+    components = {
+        "checks_version": CHECKS_VERSION,
+        "script": file_sha256(script_file),
+        "templates": {path: file_sha256(path) for path in sorted(template_paths)},
+        "datasets": dataset_manifest_sha256(dataset_objects),
+        "output": file_sha256(output_file),
+    }
+    return hashlib.sha256(json.dumps(components, sort_keys=True).encode()).hexdigest()
+
+
+def _local_path(key):
+    return os.path.join(VERIFICATION_CACHE_DIR, f"{key}.json")
+
+
+def _local_lookup(key):
+    try:
+        with open(_local_path(key), "r") as file:
+            entry = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+    return entry if entry.get("expires_at", 0) > time.time() else None
+
+
+def _local_record(key, entry):
+    os.makedirs(VERIFICATION_CACHE_DIR, exist_ok=True)
+    tmp_path = _local_path(key) + f".{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(entry, file)
+    os.replace(tmp_path, _local_path(key))
+
+
+def _dynamodb_lookup(key):
+    dynamodb = get_client('dynamodb')
+    item = dynamodb.get_item(TableName=VERIFICATION_CACHE_TABLE, Key={'cache_key': {'S': key}}).get('Item')
+    # Expired items linger until the TTL sweeper deletes them
+    if item is None or int(item['expires_at']['N']) <= time.time():
+        return None
+    return json.loads(item['details']['S'])
+
+
+def _dynamodb_record(key, entry):
+    dynamodb = get_client('dynamodb')
+    dynamodb.put_item(
+        TableName=VERIFICATION_CACHE_TABLE,
+        Item={
+            'cache_key': {'S': key},
+            'expires_at': {'N': str(entry["expires_at"])},
+            'details': {'S': json.dumps(entry)},
+        }
+    )
+
+
+def cache_enabled():
+    if VERIFICATION_CACHE_BACKEND == "local":
+        return bool(VERIFICATION_CACHE_DIR)
+    return VERIFICATION_CACHE_BACKEND == "dynamodb"
+
+
+def lookup(key):
+    # Any backend failure is a miss: the checks simply run again
+    if not cache_enabled():
+        return None
+    try:
+        if VERIFICATION_CACHE_BACKEND == "dynamodb":
+            return _dynamodb_lookup(key)
+        return _local_lookup(key)
+    except (OSError, BotoCoreError, ClientError) as e:
+        logging.warning(f"Verification cache lookup failed: {e}")
+        return None
+
+
+def record(key, **details):
+    # Only passing checks are recorded; failures may be transient (timeouts, OOM) and are rerun
+    if not cache_enabled():
+        return
+    entry = {**details, "verified_at": int(time.time()), "expires_at": int(time.time()) + VERIFICATION_CACHE_TTL_DAYS * 86400}
+    try:
+        if VERIFICATION_CACHE_BACKEND == "dynamodb":
+            _dynamodb_record(key, entry)
+        else:
+            _local_record(key, entry)
+    except (OSError, BotoCoreError, ClientError) as e:
+        logging.warning(f"Verification cache update failed: {e}")
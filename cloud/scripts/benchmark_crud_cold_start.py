@@ -0,0 +1,121 @@
+"""Measures CRUD Lambda cold starts locally.
+
+Each sample runs in a fresh interpreter, like a new Lambda execution environment, and times the
+module import and then the first and second invocation of one route. No request reaches AWS: the
+measured routes only build clients, sign URLs or reject a payload, using dummy credentials.
+
+    python scripts/benchmark_crud_cold_start.py --samples 20
+    python scripts/benchmark_crud_cold_start.py --importtime
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+LAMBDA_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "src", "api_stack", "assets", "MlCrudLambda")
+
+EVENTS = {
+    "options": {"httpMethod": "OPTIONS", "path": "/crud/benchmarks"},
+    "upload_link": {
+        "httpMethod": "GET",
+        "path": "/crud/get_file_upload_link",
+        "queryStringParameters": {
+            "file_name": "script.py",
+            "email": "bench@example.com",
+            "submission_timestamp": "0",
+        },
+    },
+    # Rejected by the schema before any AWS call, so it measures the validator alone
+    "submission_invalid": {
+        "httpMethod": "POST",
+        "path": "/crud/submission",
+        "body": json.dumps({"email": "bench@example.com"}),
+    },
+    # The benchmarks route queries DynamoDB; only building its table resource is measured
+    "benchmarks_client": None,
+}
+
+CHILD = r'''
+import json, sys, time
+route, event = sys.argv[1], json.loads(sys.argv[2])
+started = time.perf_counter()
+import lambda_function
+timings = {"import_ms": (time.perf_counter() - started) * 1000}
+for name in ("first_ms", "second_ms"):
+    started = time.perf_counter()
+    if event is None:
+        lambda_function.dynamodb_table(lambda_function.BENCHMARKS_TABLE_NAME)
+    else:
+        lambda_function.handler(event, None)
+    timings[name] = (time.perf_counter() - started) * 1000
+print("TIMINGS " + json.dumps(timings))
+'''
+
+
+def child_env():
+    env = dict(os.environ)
+    env.update({
+        "AWS_ACCESS_KEY_ID": "benchmark",
+        "AWS_SECRET_ACCESS_KEY": "benchmark",
+        "AWS_DEFAULT_REGION": env.get("AWS_DEFAULT_REGION", "us-east-1"),
+        "AWS_EC2_METADATA_DISABLED": "true",
+    })
+    return env
+
+
+def sample(route):
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD, route, json.dumps(EVENTS[route])],
+        cwd=LAMBDA_DIR, env=child_env(), capture_output=True, text=True, check=True,
+    )
+    # The handler logs and prints; the timings are the tagged line
+    line = next(line for line in result.stdout.splitlines() if line.startswith("TIMINGS "))
+    return json.loads(line[len("TIMINGS "):])
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def report(route, samples):
+    for metric in ("import_ms", "first_ms", "second_ms"):
+        values = [s[metric] for s in samples]
+        print(f"{route:<20} {metric:<10} median {statistics.median(values):8.1f}  "
+              f"p90 {percentile(values, 0.9):8.1f}  max {max(values):8.1f}")
+
+
+def import_profile(top):
+    # Slowest imports by cumulative time, from one cold interpreter
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import lambda_function"],
+        cwd=LAMBDA_DIR, env=child_env(), capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.rstrip()))
+    for cumulative, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark CRUD Lambda import and first-invocation time")
+    parser.add_argument("--samples", type=int, default=20, help="Fresh interpreters per route")
+    parser.add_argument("--routes", nargs="+", choices=sorted(EVENTS), default=sorted(EVENTS))
+    parser.add_argument(
+        "--importtime", action="store_true", help="Print the slowest module imports instead")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    if args.importtime:
+        import_profile(args.top)
+    else:
+        for route in args.routes:
+            report(route, [sample(route) for _ in range(args.samples)])
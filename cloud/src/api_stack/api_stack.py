@@ -24,6 +24,14 @@ class ApiStack(Stack):
         self._account = config["aws_account"]
         self._region = config["aws_region"]
         
+        # Read routes cached by the stage, keyed on their query string:
+        # {route: {ttl_seconds, cache_key_parameters}}
+        cache_config = config["api"]["cache"]
+        cached_routes = {
+            route: options for route, options in cache_config["routes"].items()
+            if options["ttl_seconds"] > 0
+        }
+
         api_role = iam.Role(
             self,
             "RestAPIRole",
@@ -37,7 +45,18 @@ class ApiStack(Stack):
             description="ML training managed by AWS Batch",
             deploy_options=apig.StageOptions(
                 metrics_enabled=True,
+                # Caching stays off stage-wide and is enabled per method; the cluster only exists
+                # when some route uses it
                 caching_enabled=False,
+                cache_cluster_enabled=bool(cached_routes),
+                cache_cluster_size=cache_config["cluster_size"] if cached_routes else None,
+                method_options={
+                    f"/crud/{route}/GET": apig.MethodDeploymentOptions(
+                        caching_enabled=True,
+                        cache_ttl=cdk.Duration.seconds(options["ttl_seconds"]),
+                    )
+                    for route, options in cached_routes.items()
+                },
                 logging_level=apig.MethodLoggingLevel.INFO,
                 tracing_enabled=True,
                 access_log_destination=apig.LogGroupLogDestination(
@@ -52,7 +71,7 @@ class ApiStack(Stack):
         )
 
         # self._api_sfn_execute(api, api_role, sfn_state_machine)
-        self._api_crud(api, config,sfn_state_machine)
+        self._api_crud(api, config,sfn_state_machine, cached_routes)
 
         # Create API Key and Usage Plan
         api_key = api.add_api_key(
@@ -219,7 +238,8 @@ class ApiStack(Stack):
         #         ],
         #     )
 
-    def _api_crud(self, api: apig.RestApi, config:Dict,sfn_state_machine: sfn.IStateMachine,):
+    def _api_crud(self, api: apig.RestApi, config:Dict,sfn_state_machine: sfn.IStateMachine,
+                  cached_routes: Dict):
         crud_lambda = CrudLambda(self, "MlCrudLambda", config, sfn_state_machine)
         # Add Lambda Integration
         integration_crud = apig.LambdaIntegration(
@@ -244,6 +264,27 @@ class ApiStack(Stack):
             api_key_required=True,
         )
 
+        # Cached routes get explicit resources, which take precedence over the proxy. Stage caching
+        # is configured per resource path and keys only on declared query string parameters.
+        for route, options in cached_routes.items():
+            cache_key_parameters = [
+                f"method.request.querystring.{name}" for name in options["cache_key_parameters"]
+            ]
+            resource_crud_base.add_resource(route).add_method(
+                "GET",
+                apig.LambdaIntegration(
+                    crud_lambda.crud_lambda,
+                    cache_key_parameters=cache_key_parameters,
+                ),
+                request_parameters={parameter: False for parameter in cache_key_parameters},
+                method_responses=[
+                    {
+                        "statusCode": "200",
+                    }
+                ],
+                api_key_required=True,
+            )
+
         # # Add CORS Options Method for CRUD
         # if not resource_crud_proxy.get_resource("OPTIONS"):
         #     resource_crud_proxy.add_method(
@@ -1,28 +1,69 @@
+import base64
+import binascii
 import json
-import boto3
-from botocore.exceptions import NoCredentialsError
-from urllib.parse import urlparse
 import logging
 import os
-from datetime import datetime
-from decimal import Decimal
+import time
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
 from urllib.parse import unquote
 import traceback
-import uuid
-import jsonschema
-from jsonschema import validate
+
+# boto3, botocore and jsonschema are imported by the routes that use them, so a cold start
+# only pays for what the first request needs (an OPTIONS preflight needs none of them)
 
 # Environment variables
 BENCHMARKS_TABLE_NAME = os.environ.get("BENCHMARKS_TABLE", "benchmarks")
 USER_SCRIPTS_BUCKET_NAME = os.environ.get("USER_SCRIPTS_BUCKET_NAME", "jkpfactors-user-scripts")
 SUBMISSIONS_TABLE_NAME = os.environ.get("SUBMISSIONS_TABLE", "submissions")
 STATE_MACHINE_ARN = os.environ.get("STATE_MACHINE_ARN")
+LEADERBOARD_INDEX = os.environ.get("LEADERBOARD_INDEX", "leaderboard-index")
+LEADERBOARD_DEFAULT = os.environ.get("LEADERBOARD_DEFAULT", "2024")
+# Files from UPLOAD_MULTIPART_THRESHOLD_MB up are uploaded in parts of at least UPLOAD_PART_SIZE_MB
+UPLOAD_MULTIPART_THRESHOLD_MB = int(os.environ.get("UPLOAD_MULTIPART_THRESHOLD_MB", "100"))
+UPLOAD_PART_SIZE_MB = int(os.environ.get("UPLOAD_PART_SIZE_MB", "64"))
+# Part URLs outlive single PUT URLs for slow links; the Lambda role session caps both
+UPLOAD_URL_EXPIRATION_SECONDS = int(os.environ.get("UPLOAD_URL_EXPIRATION_SECONDS", "3600"))
+UPLOAD_PART_URL_EXPIRATION_SECONDS = int(
+    os.environ.get("UPLOAD_PART_URL_EXPIRATION_SECONDS", "14400"))
+# Bounds the response below Lambda's 6 MB payload limit; larger files get larger parts
+UPLOAD_MAX_FILES = 10
+UPLOAD_MAX_PARTS_PER_FILE = 200
+S3_MAX_PART_SIZE = 5 * 1024 ** 3
+BENCHMARKS_PAGE_SIZE = int(os.environ.get("BENCHMARKS_PAGE_SIZE", "100"))
+BENCHMARKS_MAX_PAGE_SIZE = 1000
+# Warm invocations serve repeated reads from memory until the TTL passes or a benchmark is stored
+BENCHMARKS_CACHE_TTL_SECONDS = int(os.environ.get("BENCHMARKS_CACHE_TTL_SECONDS", "300"))
+BENCHMARKS_VERSION_CHECK_SECONDS = float(os.environ.get("BENCHMARKS_VERSION_CHECK_SECONDS", "5"))
+BENCHMARKS_CACHE_MAX_ENTRIES = 256
+# Counter item the batch job bumps after it stores benchmarks
+BENCHMARKS_VERSION_KEY = {"email": "#benchmarks-version", "submission_timestamp": "0"}
+
+
+# AWS clients are created on first use and then reused by every warm invocation
+@lru_cache(maxsize=None)
+def dynamodb_table(table_name):
+    import boto3
+    return boto3.resource("dynamodb").Table(table_name)
+
+
+@lru_cache(maxsize=None)
+def sfn_client():
+    import boto3
+    return boto3.client("stepfunctions")
+
+
+@lru_cache(maxsize=None)
+def s3_presign_client():
+    # Also serves the multipart create/list/complete/abort calls
+    import boto3
+    from botocore.config import Config
+    return boto3.client("s3", config=Config(signature_version="s3v4"))
+
 
-# Initialize AWS clients
-dynamodb = boto3.resource("dynamodb")
-sfn_client = boto3.client("stepfunctions")
-benchmarks_table = dynamodb.Table(BENCHMARKS_TABLE_NAME)
-submissions_table = dynamodb.Table(SUBMISSIONS_TABLE_NAME)
+# Module-level so they survive warm invocations: query -> (version, cached_at, response body)
+benchmarks_cache = {}
+benchmarks_version = {"value": None, "checked_at": 0.0}
 
 # Logging
 logger = logging.getLogger()
@@ -49,16 +90,98 @@ schema = {
     ]
 }
 
+upload_file_properties = {
+    "email": {"type": "string", "format": "email"},
+    "submission_timestamp": {"type": "string"},
+}
+
+upload_links_schema = {
+    "type": "object",
+    "properties": {
+        **upload_file_properties,
+        "files": {
+            "type": "array",
+            "minItems": 1,
+            "maxItems": UPLOAD_MAX_FILES,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "file_name": {"type": "string", "minLength": 1},
+                    "size": {"type": "integer", "minimum": 0}
+                },
+                "required": ["file_name", "size"]
+            }
+        }
+    },
+    "required": ["email", "submission_timestamp", "files"]
+}
+
+multipart_upload_schema = {
+    "type": "object",
+    "properties": {
+        **upload_file_properties,
+        "file_name": {"type": "string", "minLength": 1},
+        "upload_id": {"type": "string", "minLength": 1},
+        "parts": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "part_number": {"type": "integer", "minimum": 1},
+                    "etag": {"type": "string"}
+                },
+                "required": ["part_number", "etag"]
+            }
+        }
+    },
+    "required": ["email", "submission_timestamp", "file_name", "upload_id"]
+}
+
+schemas = {
+    "submission": schema,
+    "upload_links": upload_links_schema,
+    "abort_multipart_upload": multipart_upload_schema,
+    "complete_multipart_upload": {
+        **multipart_upload_schema,
+        "required": multipart_upload_schema["required"] + ["parts"],
+    },
+}
+
+
+@lru_cache(maxsize=None)
+def compiled_validator(schema_name):
+    # Checked and compiled once instead of on every jsonschema.validate call
+    from jsonschema.validators import validator_for
+    validator_class = validator_for(schemas[schema_name])
+    validator_class.check_schema(schemas[schema_name])
+    return validator_class(schemas[schema_name])
+
+
+def validate_payload(schema_name, payload):
+    # Returns a 400 response for an invalid payload, None otherwise.
+    # best_match picks the same error jsonschema.validate would raise.
+    from jsonschema.exceptions import best_match
+    err = best_match(compiled_validator(schema_name).iter_errors(payload))
+    if err is None:
+        return None
+    return {
+        "statusCode": 400,
+        "body": json.dumps({"error": f"Invalid payload: {err.message}"})
+    }
+
+
 class DecimalEncoder(json.JSONEncoder):
     def default(self, o):
         if isinstance(o, Decimal):
             return str(o)
         return super(DecimalEncoder, self).default(o)
 
+
 def generate_presigned_url(bucket_name, object_name, expiration_time=3600, action="put_object"):
-    s3_client = boto3.client('s3', config=boto3.session.Config(signature_version='s3v4'))
+    from botocore.exceptions import NoCredentialsError
     try:
-        response = s3_client.generate_presigned_url(
+        response = s3_presign_client().generate_presigned_url(
             action,
             Params={"Bucket": bucket_name, "Key": object_name},
             ExpiresIn=expiration_time,
@@ -68,6 +191,7 @@ def generate_presigned_url(bucket_name, object_name, expiration_time=3600, actio
         print("Credentials not available")
         return None
 
+
 def get_file_upload_link(event):
     file_name = unquote(event.get("queryStringParameters", {}).get("file_name"))
     email = unquote(event.get("queryStringParameters", {}).get("email"))
@@ -94,32 +218,301 @@ def get_file_upload_link(event):
             "body": json.dumps({"error": "Failed to generate presigned URL"}),
         }
 
-def get_benchmarks():
-    benchmarks_response = benchmarks_table.scan()
-    benchmarks = benchmarks_response.get("Items", {})
+
+def upload_object_name(email, submission_timestamp, file_name):
+    # Clients name files, never keys, so uploads stay under their own submission prefix
+    return f"unprocessed/submissions/{email}/{submission_timestamp}/{os.path.basename(file_name)}"
+
+
+def multipart_part_size(size):
+    part_size = UPLOAD_PART_SIZE_MB * 1024 ** 2
+    return max(part_size, -(-size // UPLOAD_MAX_PARTS_PER_FILE))
+
+
+def get_upload_links(event):
+    # One call for all files of a submission: a presigned PUT for small files, and for large ones a
+    # multipart upload with a presigned URL per part, so clients can upload the parts in parallel
+    payload = json.loads(event["body"])
+    invalid = validate_payload("upload_links", payload)
+    if invalid:
+        return invalid
+
+    s3_client = s3_presign_client()
+    uploads = []
+    for file in payload["files"]:
+        object_name = upload_object_name(
+            payload["email"], payload["submission_timestamp"], file["file_name"])
+        upload = {
+            "file_name": file["file_name"],
+            "s3_uri": f"s3://{USER_SCRIPTS_BUCKET_NAME}/{object_name}",
+        }
+        if file["size"] < UPLOAD_MULTIPART_THRESHOLD_MB * 1024 ** 2:
+            upload["method"] = "put"
+            upload["presigned_url"] = s3_client.generate_presigned_url(
+                "put_object",
+                Params={"Bucket": USER_SCRIPTS_BUCKET_NAME, "Key": object_name},
+                ExpiresIn=UPLOAD_URL_EXPIRATION_SECONDS,
+            )
+            uploads.append(upload)
+            continue
+
+        part_size = multipart_part_size(file["size"])
+        if part_size > S3_MAX_PART_SIZE:
+            return {
+                "statusCode": 400,
+                "body": json.dumps({"error": f"{file['file_name']} is too large to upload"}),
+            }
+        upload_id = s3_client.create_multipart_upload(
+            Bucket=USER_SCRIPTS_BUCKET_NAME, Key=object_name)["UploadId"]
+        upload["method"] = "multipart"
+        upload["upload_id"] = upload_id
+        upload["part_size"] = part_size
+        upload["parts"] = [
+            {
+                "part_number": part_number,
+                "presigned_url": s3_client.generate_presigned_url(
+                    "upload_part",
+                    Params={
+                        "Bucket": USER_SCRIPTS_BUCKET_NAME,
+                        "Key": object_name,
+                        "UploadId": upload_id,
+                        "PartNumber": part_number,
+                    },
+                    ExpiresIn=UPLOAD_PART_URL_EXPIRATION_SECONDS,
+                ),
+            }
+            for part_number in range(1, -(-file["size"] // part_size) + 1)
+        ]
+        uploads.append(upload)
 
     return {
         "statusCode": 200,
-        "body": json.dumps({"benchmarks": benchmarks}, cls=DecimalEncoder),
+        "body": json.dumps({"uploads": uploads}),
     }
 
-def add_submission(event):
-    # Parse and validate the payload
+
+def multipart_upload_exists(object_name, upload_id):
+    # S3 answers NoSuchUpload unless upload_id was started for exactly this key, so a caller can
+    # only complete or abort uploads under their own submission prefix
+    from botocore.exceptions import ClientError
+    try:
+        s3_presign_client().list_parts(
+            Bucket=USER_SCRIPTS_BUCKET_NAME, Key=object_name, UploadId=upload_id, MaxParts=1)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "NoSuchUpload":
+            return False
+        raise
+    return True
+
+
+def unknown_upload_response(file_name):
+    return {
+        "statusCode": 404,
+        "body": json.dumps(
+            {"error": f"No multipart upload in progress with this upload_id for {file_name}"}),
+    }
+
+
+def complete_multipart_upload(event):
+    # parts: the part_number and the ETag header S3 returned for every uploaded part
+    from botocore.exceptions import ClientError
     payload = json.loads(event["body"])
+    invalid = validate_payload("complete_multipart_upload", payload)
+    if invalid:
+        return invalid
+
+    object_name = upload_object_name(
+        payload["email"], payload["submission_timestamp"], payload["file_name"])
+    if not multipart_upload_exists(object_name, payload["upload_id"]):
+        return unknown_upload_response(payload["file_name"])
+    parts = sorted(payload["parts"], key=lambda part: part["part_number"])
     try:
-        validate(instance=payload, schema=schema)
-    except jsonschema.exceptions.ValidationError as err:
+        s3_presign_client().complete_multipart_upload(
+            Bucket=USER_SCRIPTS_BUCKET_NAME,
+            Key=object_name,
+            UploadId=payload["upload_id"],
+            MultipartUpload={"Parts": [
+                {"PartNumber": part["part_number"], "ETag": part["etag"]} for part in parts
+            ]},
+        )
+    except ClientError as e:
         return {
             "statusCode": 400,
-            "body": json.dumps({"error": f"Invalid payload: {err.message}"})
+            "body": json.dumps({"error": f"Error completing upload: {e}"}),
         }
+    return {
+        "statusCode": 200,
+        "body": json.dumps({"s3_uri": f"s3://{USER_SCRIPTS_BUCKET_NAME}/{object_name}"}),
+    }
+
+
+def abort_multipart_upload(event):
+    # Frees the parts of an upload the client gave up on; S3 keeps and bills them otherwise
+    from botocore.exceptions import ClientError
+    payload = json.loads(event["body"])
+    invalid = validate_payload("abort_multipart_upload", payload)
+    if invalid:
+        return invalid
+
+    object_name = upload_object_name(
+        payload["email"], payload["submission_timestamp"], payload["file_name"])
+    if not multipart_upload_exists(object_name, payload["upload_id"]):
+        return unknown_upload_response(payload["file_name"])
+    try:
+        s3_presign_client().abort_multipart_upload(
+            Bucket=USER_SCRIPTS_BUCKET_NAME, Key=object_name, UploadId=payload["upload_id"])
+    except ClientError as e:
+        return {
+            "statusCode": 400,
+            "body": json.dumps({"error": f"Error aborting upload: {e}"}),
+        }
+    return {
+        "statusCode": 200,
+        "body": json.dumps({"message": "Upload aborted"}),
+    }
+
+
+def encode_cursor(last_evaluated_key):
+    if not last_evaluated_key:
+        return None
+    encoded = json.dumps(last_evaluated_key, cls=DecimalEncoder).encode()
+    return base64.urlsafe_b64encode(encoded).decode()
+
+
+def decode_cursor(cursor):
+    # Raises ValueError, InvalidOperation, binascii.Error, KeyError or TypeError for anything
+    # encode_cursor did not produce
+    last_evaluated_key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(last_evaluated_key, dict) or not last_evaluated_key:
+        raise ValueError("cursor is not a key")
+    # sharpe_value is the index sort key and must go back as a number
+    if "sharpe_value" in last_evaluated_key:
+        last_evaluated_key["sharpe_value"] = Decimal(last_evaluated_key["sharpe_value"])
+    return last_evaluated_key
+
+
+def current_benchmarks_version():
+    # Re-read at most every BENCHMARKS_VERSION_CHECK_SECONDS: one small GetItem instead of a page
+    # of results
+    now = time.monotonic()
+    checked_at = benchmarks_version["checked_at"]
+    if benchmarks_version["value"] is None or now - checked_at >= BENCHMARKS_VERSION_CHECK_SECONDS:
+        table = dynamodb_table(BENCHMARKS_TABLE_NAME)
+        item = table.get_item(Key=BENCHMARKS_VERSION_KEY).get("Item", {})
+        benchmarks_version["value"] = int(item.get("version", 0))
+        benchmarks_version["checked_at"] = now
+    return benchmarks_version["value"]
+
+
+def cached_benchmarks(cache_key, version):
+    cached = benchmarks_cache.get(cache_key)
+    fresh = cached and time.monotonic() - cached[1] < BENCHMARKS_CACHE_TTL_SECONDS
+    if fresh and cached[0] == version:
+        return cached[2]
+    return None
+
+
+def cache_benchmarks(cache_key, version, body):
+    benchmarks_cache.pop(cache_key, None)
+    if len(benchmarks_cache) >= BENCHMARKS_CACHE_MAX_ENTRIES:
+        # Oldest entry first, dicts keep insertion order
+        benchmarks_cache.pop(next(iter(benchmarks_cache)))
+    benchmarks_cache[cache_key] = (version, time.monotonic(), body)
+
+
+def scan_benchmarks():
+    # The original unpaginated response: every benchmark, in table order
+    from boto3.dynamodb.conditions import Attr
+    table = dynamodb_table(BENCHMARKS_TABLE_NAME)
+    scan = {"FilterExpression": Attr("email").ne(BENCHMARKS_VERSION_KEY["email"])}
+    benchmarks = []
+    while True:
+        benchmarks_response = table.scan(**scan)
+        benchmarks.extend(benchmarks_response.get("Items", []))
+        if "LastEvaluatedKey" not in benchmarks_response:
+            return {"benchmarks": benchmarks}
+        scan["ExclusiveStartKey"] = benchmarks_response["LastEvaluatedKey"]
+
+
+def query_benchmarks(params, limit, exclusive_start_key):
+    # Reads only the page returned: the top of a leaderboard by Sharpe, or one user's benchmarks
+    # newest first
+    from boto3.dynamodb.conditions import Key
+    query = {"Limit": limit, "ScanIndexForward": False}
+    if params.get("email"):
+        query["KeyConditionExpression"] = Key("email").eq(unquote(params["email"]))
+    else:
+        query["IndexName"] = LEADERBOARD_INDEX
+        leaderboard = params.get("dataset_year", LEADERBOARD_DEFAULT)
+        query["KeyConditionExpression"] = Key("leaderboard").eq(leaderboard)
+    if exclusive_start_key:
+        query["ExclusiveStartKey"] = exclusive_start_key
+
+    benchmarks_response = dynamodb_table(BENCHMARKS_TABLE_NAME).query(**query)
+    return {
+        "benchmarks": benchmarks_response.get("Items", []),
+        "next_cursor": encode_cursor(benchmarks_response.get("LastEvaluatedKey")),
+    }
+
+
+def get_benchmarks(event):
+    # Without any leaderboard parameter the route keeps its original full-table response
+    params = event.get("queryStringParameters") or {}
+    paginated = any(params.get(name) for name in ("limit", "cursor", "dataset_year", "email"))
+    try:
+        limit = int(params.get("limit") or BENCHMARKS_PAGE_SIZE)
+        if not 0 < limit <= BENCHMARKS_MAX_PAGE_SIZE:
+            raise ValueError
+    except (ValueError, TypeError):
+        return {
+            "statusCode": 400,
+            "body": json.dumps(
+                {"error": f"limit must be between 1 and {BENCHMARKS_MAX_PAGE_SIZE}"}),
+        }
+    try:
+        cursor = params.get("cursor")
+        exclusive_start_key = decode_cursor(cursor) if cursor else None
+    except (ValueError, InvalidOperation, binascii.Error, KeyError, TypeError):
+        return {
+            "statusCode": 400,
+            "body": json.dumps({"error": "invalid cursor"}),
+        }
+
+    cache_key = "all"
+    if paginated:
+        cache_key = (limit, params.get("cursor"), params.get("email"), params.get("dataset_year"))
+    version = current_benchmarks_version() if BENCHMARKS_CACHE_TTL_SECONDS > 0 else None
+    body = cached_benchmarks(cache_key, version) if version is not None else None
+    if body is not None:
+        return {"statusCode": 200, "body": body}
+
+    if paginated:
+        response = query_benchmarks(params, limit, exclusive_start_key)
+    else:
+        response = scan_benchmarks()
+    body = json.dumps(response, cls=DecimalEncoder)
+    if version is not None:
+        cache_benchmarks(cache_key, version, body)
+
+    return {
+        "statusCode": 200,
+        "body": body,
+    }
+
+
+def add_submission(event):
+    # Parse and validate the payload
+    payload = json.loads(event["body"])
+    invalid = validate_payload("submission", payload)
+    if invalid:
+        return invalid
     
     # Put the item in the DynamoDB table
     try:
-        submissions_table.put_item(Item=payload)
+        dynamodb_table(SUBMISSIONS_TABLE_NAME).put_item(Item=payload)
         
         # Start the Step Functions execution
-        response = sfn_client.start_execution(
+        response = sfn_client().start_execution(
             stateMachineArn=STATE_MACHINE_ARN,
             name=f"job-{payload['submission_timestamp']}",
             input=json.dumps(payload)
@@ -137,6 +530,7 @@ def add_submission(event):
             "body": json.dumps({"error": f"Error adding submission: {e}"})
         }
 
+
 def add_cors(response):
     response["headers"] = {
         "Access-Control-Allow-Origin": "*",
@@ -145,6 +539,7 @@ def add_cors(response):
     }
     return response
 
+
 def handler(event, context):
     logger.info(f"Got event: {event}")
     try:
@@ -160,9 +555,19 @@ def handler(event, context):
         elif event["httpMethod"] == "POST":
             if event["path"] == "/crud/submission":
                 return add_cors(add_submission(event))
+            elif event["path"] == "/crud/upload_links":
+                return add_cors(get_upload_links(event))
+            elif event["path"] == "/crud/complete_multipart_upload":
+                return add_cors(complete_multipart_upload(event))
+            elif event["path"] == "/crud/abort_multipart_upload":
+                return add_cors(abort_multipart_upload(event))
+            return {
+                "statusCode": 404,
+                "body": json.dumps("Invalid API resource path!"),
+            }
         elif event["httpMethod"] == "GET":
             if event["path"] == "/crud/benchmarks":
-                return add_cors(get_benchmarks())
+                return add_cors(get_benchmarks(event))
             elif event["path"] == "/crud/get_file_upload_link":
                 return add_cors(get_file_upload_link(event))
             return {
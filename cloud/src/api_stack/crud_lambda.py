@@ -51,6 +51,10 @@ class CrudLambda(Construct):
             role_name="CrudLambdaRole"+self._config["stage"]
         )
         crud_role.add_managed_policy(iam.ManagedPolicy.from_aws_managed_policy_name("AWSStepFunctionsFullAccess"))
+        # Dataset year the batch job currently scores against, e.g. ".../complete/2024" -> "2024"
+        complete_data_uri = self._config["compute"]["batchjob"]["env"]["COMPLETE_DATA_S3_URI"]
+        leaderboard_default = complete_data_uri.rstrip("/").split("/")[-1]
+        cache_config = self._config["api"]["cache"]
         
         self.crud_lambda = lambda_.Function(
             self,
@@ -62,6 +66,11 @@ class CrudLambda(Construct):
                 "USER_SCRIPTS_BUCKET_NAME": self._config["storage"]["s3"]["scripts_upload_bucket"],
                 "BENCHMARKS_TABLE": self._config["storage"]["db"]["benchmarks_table"],
                 "SUBMISSIONS_TABLE": self._config["storage"]["db"]["submissions_table"],
+                "LEADERBOARD_INDEX": self._config["storage"]["db"]["leaderboard_index"],
+                "LEADERBOARD_DEFAULT": leaderboard_default,
+                "BENCHMARKS_CACHE_TTL_SECONDS": str(cache_config["lambda_ttl_seconds"]),
+                "BENCHMARKS_VERSION_CHECK_SECONDS": str(
+                    cache_config["lambda_version_check_seconds"]),
                 "STATE_MACHINE_ARN": sfn_state_machine.state_machine_arn
 
             },
@@ -198,6 +198,9 @@ class BatchJobStack(Stack):
             "S3_BUCKET": ml_batch_jobs_bucket.bucket_name,
             "USER_SCRIPTS_BUCKET_NAME": scripts_s3_bucket.bucket_name,
             "AWS_DEFAULT_REGION": config["aws_region"],
+            "SUBMISSIONS_TABLE": config["storage"]["db"]["submissions_table"],
+            "BENCHMARKS_TABLE": config["storage"]["db"]["benchmarks_table"],
+            "VERIFICATION_CACHE_TABLE": config["storage"]["db"]["verification_cache_table"],
         }
 
         batchjob_env = config["compute"]["batchjob"]["env"]
@@ -207,6 +210,15 @@ class BatchJobStack(Stack):
         job_definition_container_env = job_definition_container_env_base.copy()
         lustre_volumes = None
 
+        # Host directory outliving the container, so later jobs on the instance reuse the datasets
+        data_cache_volumes = [
+            batch.EcsVolume.host(
+                name="data-cache",
+                host_path="/var/cache/jkpfactors",
+                container_path=batchjob_env["DATA_CACHE_DIR"],
+            )
+        ]
+
         nvidia_tag = "latest"
         batch_jobdef_nvidia_container = batch.EcsEc2ContainerDefinition(
             self,
@@ -219,7 +231,7 @@ class BatchJobStack(Stack):
             gpu=1,
             cpu=4,
             memory=cdk.Size.mebibytes(8192),
-            volumes=lustre_volumes,
+            volumes=(lustre_volumes or []) + data_cache_volumes,
         )
 
         self.mltraining_nvidia_job = MlTrainingBatchJob(
@@ -6,6 +6,7 @@ import os
 
 import aws_cdk as cdk
 from aws_cdk import Stack
+from aws_cdk import aws_dynamodb as dynamodb
 from aws_cdk import aws_ec2 as ec2
 from aws_cdk import aws_ecr as ecr
 from aws_cdk import aws_fsx as fsx
@@ -28,6 +29,7 @@ class StorageStack(Stack):
     scripts_s3_bucket = None
     training_data_s3_bucket = None
     ml_batch_jobs_bucket = None
+    verification_cache_table = None
 
     def __init__(self, scope: Construct, construct_id: str, config:Dict, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
@@ -62,6 +64,18 @@ class StorageStack(Stack):
         )
         self.ecr_registry = ecr_registry
 
+        # Integrity-check results keyed by script, template and dataset hashes; expired through TTL
+        verification_cache_table = dynamodb.Table(
+            self,
+            "verification-cache-table",
+            table_name=config["storage"]["db"]["verification_cache_table"],
+            partition_key=dynamodb.Attribute(name="cache_key", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expires_at",
+            removal_policy=cdk.RemovalPolicy.DESTROY,
+        )
+        self.verification_cache_table = verification_cache_table
+
 
         # Cloudformation outputs
         cdk.CfnOutput(